@@ -1,30 +1,82 @@
 from fastapi import FastAPI, Form, Request, UploadFile, File, Depends
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Optional
-from google.generativeai import configure, GenerativeModel
-from PyPDF2 import PdfReader
+from typing import List, Optional
+from contextlib import aclosing, asynccontextmanager
+import asyncio
+import functools
 import logging
-import re
 import os
+import time
 from dotenv import load_dotenv
 import uvicorn
-import time
-import threading
-from app.utils.firebase_config import verify_token
+from app.utils.firebase_config import keep_signing_keys_fresh, refresh_signing_keys, verify_token
 from app.utils.user_profile import save_user_data
 from app.models.user import create_user, get_user_by_google_id
-from app.utils.database import initialize_db
+from app.models.question import get_generated_questions, save_generated_questions
+from app.models.job import get_job
+from app.models.document import delete_document, get_document
+from app.models.token_usage import get_token_usage, record_token_usage
+from app.utils.database import close_pool, initialize_db
+from app.utils import executor, pdf_cache, retrieval, response_cache
+from app.utils.pdf_cache import load_pdf_text, pdf_text_for
+from app.utils.documents import (
+    DOCUMENT_TTL, DocumentNotFound, collect_garbage_forever, load_document_text, open_document, save_document,
+)
+from app.utils.pdf_text import UploadTooLarge, spool_upload
+from app.utils.executor import ServerBusy, run_blocking, run_llm, run_llm_stream, shutdown_executors
+from app.utils.question_generator import (
+    MCQ_GENERATION_CONFIG, THEORY_GENERATION_CONFIG, generate_mcqs, generate_theory_questions, plan_theory_paper,
+)
+from app.utils.retrieval import select_context
+from app.utils.topic_index import topic_excerpt
+from app.utils.response_cache import CachedResponse, get_cached_response, response_key, store_response
+from app.utils.jobs import JobWorkerPool
+from app.utils.llm import create_llm_provider
+from app.utils.token_accounting import current_account, current_endpoint, token_estimator
+from app.utils.singleflight import SingleFlight, StreamFlight
+from app.utils.metrics import (
+    COALESCED_CALLS, EXECUTOR_WAITING, GEMINI_AVAILABLE, GEMINI_BUDGET, GEMINI_REQUESTS, GEMINI_TOKENS,
+    HTTP_REQUEST_SECONDS, SCHEDULER_GRANTED, SCHEDULER_QUEUE_DEPTH, SCHEDULER_REJECTED, TOKEN_ESTIMATE_RATIO,
+    add_collector, observe_stage, record_cache_stats, render_metrics, stage_timer,
+)
+from app.utils.streaming import (
+    STREAM_FORMATS, encode_event, event_stream_response, stream_items_response, stream_text_response,
+)
+from app.utils.summarizer import build_summary_prompt
+from app.utils.batching import BATCH_MAX_FILES, BATCH_MAX_QUESTIONS, answer_questions, build_answer_prompt, summarize_documents
+from app.utils.rate_limiter import (
+    DailyLimitReached, GeminiScheduler, MAX_RPD, MAX_RPM, MAX_TPM,
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, create_quota_backend,
+)
 from app.routes import auth, questions
-import sqlite3
 from fastapi.middleware.cors import CORSMiddleware
 
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
-app = FastAPI()
+
+
+# Startup/shutdown: import time pe kuch nahi, har worker mein ek baar setup
+@asynccontextmanager
+async def lifespan(app):
+    await run_blocking(initialize_db)
+    # token verify event loop pe hota hai, isliye keys pehle se aur background mein refresh
+    await run_blocking(refresh_signing_keys)
+    signing_keys = asyncio.create_task(keep_signing_keys_fresh())
+    analysis_jobs.start()
+    document_gc = asyncio.create_task(collect_garbage_forever())
+    yield
+    document_gc.cancel()
+    signing_keys.cancel()
+    await analysis_jobs.stop()
+    shutdown_executors()
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,76 +92,284 @@ app.add_middleware(
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 # templates = Jinja2Templates(directory="templates")
 
-# initializing the gemini API
-configure(api_key=os.getenv("API_KEY"))
-model = GenerativeModel("gemini-1.5-flash")
-
-# API ka rate limit
-MAX_RPM = 15  # Max requests per minute
-MAX_RPD = 1500  # Max requests per day
-MAX_TPM = 1_000_000  # Max tokens per minute
-
-#tracking the API use
-request_count_minute = 0
-request_count_day = 0
-token_count_minute = 0
-lock = threading.Lock()  
-
-def reset_minute_count():
-    global request_count_minute, token_count_minute
-    while True:
-        time.sleep(60)
-        with lock:
-            request_count_minute = 0
-            token_count_minute = 0
-
-def reset_daily_count():
-    global request_count_day
-    while True:
-        time.sleep(24 * 60 * 60)
-        with lock:
-            request_count_day = 0
-
-# counter starting
-threading.Thread(target=reset_minute_count, daemon=True).start()
-threading.Thread(target=reset_daily_count, daemon=True).start()
+_model = None
+_scheduler = None
+
+# LLM provider pehli call pe banta hai (LLM_PROVIDER=gemini|fake|module:Class)
+def get_model():
+    global _model
+    if _model is None:
+        _model = create_llm_provider()
+    return _model
+
+# Gemini calls ka scheduler (RPM/TPM/RPD token buckets, priority queue);
+# quota state saare gunicorn workers ke beech shared hai (GEMINI_QUOTA_BACKEND)
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GeminiScheduler(MAX_RPM, MAX_TPM, MAX_RPD, backend=create_quota_backend())
+    return _scheduler
+
+def _priority_label(priority):
+    return {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}.get(priority, str(priority))
+
+
+# Rate limit ke liye wait karo (wait time metrics mein); returns the reserved tokens
+async def _acquire_quota(input_data, priority, user, generation_config=None):
+    reserved = token_estimator.count(input_data) + token_estimator.expected_output(
+        current_endpoint.get(), generation_config
+    )
+    try:
+        wait = await get_scheduler().acquire(reserved, priority=priority, user=user)
+    except DailyLimitReached as e:
+        GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="limit")
+        raise Exception(str(e))
+    observe_stage("ratelimit_wait", wait)
+    GEMINI_TOKENS.inc(reserved, kind="estimated")
+    return reserved
+
+
+# Call ke baad asli usage: estimator calibrate, reservation reconcile, ledger mein entry
+async def _settle_usage(input_data, reserved, response=None, output_text=None):
+    endpoint = current_endpoint.get()
+    prompt_tokens, output_tokens = token_estimator.usage(input_data, endpoint, response, output_text)
+    GEMINI_TOKENS.inc(prompt_tokens, kind="prompt")
+    GEMINI_TOKENS.inc(output_tokens, kind="output")
+    difference = reserved - prompt_tokens - output_tokens
+    GEMINI_TOKENS.inc(abs(difference), kind="refunded" if difference > 0 else "overrun")
+    try:
+        await get_scheduler().reconcile(difference)
+        # ledger sirf token sub pe; anonymous calls ek "" row mein
+        await run_blocking(
+            record_token_usage, current_account.get(), endpoint, prompt_tokens, output_tokens, reserved
+        )
+    except Exception as e:
+        logging.warning(f"Token accounting failed: {e}")
+
+
+# Ek jaise in-flight kaam ek hi baar: Gemini calls (cache key) aur streams, summary map-reduce, question papers
+gemini_calls = SingleFlight("gemini")
+summary_prompts = SingleFlight("summary_prompt")
+question_papers = SingleFlight("question_paper")
+gemini_streams = StreamFlight("gemini_stream")
+
 
 # Api ke rate limit ke saath call
-def call_gemini_api(input_data, model):
-    global request_count_minute, request_count_day, token_count_minute
-
-    # Estimate tokens 
-    estimated_tokens = len(input_data.split()) * 2  # output size ke liye
-
-    with lock:
-        if request_count_minute >= MAX_RPM:
-            print("Rate limit reached: Waiting for 1 minute.")
-            time.sleep(60)  #1 minute ka wait
-        if request_count_day >= MAX_RPD:
-            raise Exception("Daily rate limit reached.")
-        if token_count_minute + estimated_tokens > MAX_TPM:
-            print("Token limit reached: Waiting for 1 minute.")
-            time.sleep(60) #1 minute ka wait
-
-        # Update counters
-        request_count_minute += 1
-        request_count_day += 1
-        token_count_minute += estimated_tokens
-        
+async def call_gemini_api(input_data, model, priority=PRIORITY_BULK, user=None,
+                          generation_config=None, cache=True):
+    # same prompt pehle aa chuka hai to cache se do, quota bachao
+    cache_key = None
+    if cache:
+        cache_key = response_key(input_data, getattr(model, "model_name", type(model).__name__), generation_config)
+        cached = await run_blocking(get_cached_response, cache_key)
+        if cached is not None:
+            GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="cached")
+            return CachedResponse(cached)
+        # same prompt abhi kisi aur request ke liye chal raha hai to usi ka result lo
+        return await gemini_calls.run(
+            cache_key, _generate, input_data, model, priority, user, generation_config, cache_key
+        )
+    return await _generate(input_data, model, priority, user, generation_config)
+
+
+async def _generate(input_data, model, priority, user, generation_config=None, cache_key=None):
+    reserved = await _acquire_quota(input_data, priority, user, generation_config)
+
+    start = time.perf_counter()
     try:
-        response = model.generate_content(input_data)
-        return response
+        if generation_config:
+            response = await run_llm(
+                functools.partial(model.generate_content, input_data, generation_config=generation_config)
+            )
+        else:
+            response = await run_llm(model.generate_content, input_data)
+    except ServerBusy:
+        GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="busy")
+        # call gayi hi nahi, poora reservation wapas
+        await get_scheduler().reconcile(reserved)
+        raise
     except Exception as e:
         print(f"API Error: {e}")
+        GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="error")
+        await _settle_usage(input_data, reserved)
         return None
+    finally:
+        observe_stage("llm", time.perf_counter() - start)
+    GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="ok")
 
+    try:
+        text = response.text
+    except Exception:
+        text = None  # blocked / empty response, cache mat karo
+    await _settle_usage(input_data, reserved, response, text)
+    if cache_key and text:
+        await run_blocking(store_response, cache_key, text)
+    return response
+
+
+# Streaming call: Gemini ke text pieces jaise jaise aate hain waise yield karo
+async def stream_gemini_api(input_data, model, priority=PRIORITY_INTERACTIVE, user=None):
+    cache_key = response_key(input_data, getattr(model, "model_name", type(model).__name__))
+    cached = await run_blocking(get_cached_response, cache_key)
+    if cached is not None:
+        GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome="cached")
+        yield cached
+        return
+    in_flight = gemini_calls.pending(cache_key)
+    if in_flight is not None:
+        # wahi prompt non-streaming chal raha hai: uska poora jawab ek saath bhej do
+        COALESCED_CALLS.inc(operation="gemini")
+        response = await asyncio.shield(in_flight)
+        if response is None:
+            raise Exception("Gemini call failed")
+        yield response.text
+        return
+    # wahi prompt abhi kisi aur ke liye stream ho raha hai to usi stream mein shaamil ho jao
+    async with aclosing(
+        gemini_streams.stream(cache_key, _stream_generate, input_data, model, priority, user, cache_key)
+    ) as pieces:
+        async for piece in pieces:
+            yield piece
+
+
+async def _stream_generate(input_data, model, priority, user, cache_key):
+    reserved = await _acquire_quota(input_data, priority, user)
+
+    parts = []
+    last_chunk = None
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        # aclosing: client chala jaye to producer thread ko turant rukne ka signal mile
+        async with aclosing(
+            run_llm_stream(functools.partial(model.generate_content, input_data, stream=True))
+        ) as chunks:
+            async for chunk in chunks:
+                last_chunk = chunk
+                text = chunk.text
+                if text:
+                    if not parts:
+                        observe_stage("llm_first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield text
+        outcome = "ok"
+    except ServerBusy:
+        outcome = "busy"
+        raise
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        # disconnect ho ya error, reservation aur ledger hamesha settle karo
+        GEMINI_REQUESTS.inc(priority=_priority_label(priority), outcome=outcome)
+        if outcome == "busy":
+            await get_scheduler().reconcile(reserved)
+        else:
+            if outcome == "ok":
+                observe_stage("llm", time.perf_counter() - start)
+            # usage_metadata aakhri chunk mein aata hai
+            await _settle_usage(
+                input_data, reserved, last_chunk if outcome == "ok" else None,
+                "".join(parts) if parts else None,
+            )
+    if parts:
+        await run_blocking(store_response, cache_key, "".join(parts))
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(questions.router, prefix="/questions", tags=["Questions"])
 
+# Optional: set ho to /metrics sirf "Authorization: Bearer <token>" ke saath
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    # is request ki Gemini calls token ledger mein isi endpoint ke naam likhi jayengi
+    current_endpoint.set(request.url.path)
+    current_account.set(signed_in_user(request))
+    response = await call_next(request)
+    # route template label (/questions/{user_id}), raw path nahi, warna labels fat jaate hain
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
+
+@add_collector
+def collect_app_metrics():
+    for name, limit in (("rpm", MAX_RPM), ("tpm", MAX_TPM), ("rpd", MAX_RPD)):
+        GEMINI_BUDGET.set(limit, limit=name)
+    if _scheduler is not None:
+        stats = _scheduler.stats()
+        for priority, depth in stats["queue_depth_by_priority"].items():
+            SCHEDULER_QUEUE_DEPTH.set(depth, priority=_priority_label(priority))
+        SCHEDULER_GRANTED.set_total(stats["granted"])
+        SCHEDULER_REJECTED.set_total(stats["rejected"])
+        for key, name in (
+            ("requests_available_minute", "rpm"),
+            ("tokens_available_minute", "tpm"),
+            ("requests_available_day", "rpd"),
+        ):
+            if key in stats:
+                GEMINI_AVAILABLE.set(stats[key], limit=name)
+    responses = response_cache.cache_stats
+    record_cache_stats("response", responses["memory_hits"] + responses["disk_hits"], responses["misses"])
+    texts = pdf_cache.cache_stats
+    record_cache_stats("pdf_text", texts["memory_hits"] + texts["disk_hits"], texts["misses"])
+    record_cache_stats("retrieval_index", retrieval.index_stats["hits"], retrieval.index_stats["misses"])
+    TOKEN_ESTIMATE_RATIO.set(token_estimator.prompt_ratio)
+    EXECUTOR_WAITING.set(executor.pdf_limiter.waiting, pool="pdf")
+    EXECUTOR_WAITING.set(executor.llm_limiter.waiting, pool="llm")
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return JSONResponse(content={"error": "Unauthorized"}, status_code=401)
+    # quota snapshot SQLite padhta hai, isliye thread mein
+    body = await run_blocking(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+
+def upload_too_large_response(e):
+    return JSONResponse(content={"error": str(e)}, status_code=413)
+
+
+def server_busy_response():
+    # queue full hai, client thodi der baad retry kare
+    return JSONResponse(
+        content={"error": "Server is busy, please retry shortly."},
+        status_code=503,
+        headers={"Retry-After": "5"},
+    )
+
+def document_not_found_response(e):
+    return JSONResponse(content={"error": str(e)}, status_code=404)
+
+
+def missing_document_response():
+    return JSONResponse(content={"error": "Upload a PDF or pass a document_id."}, status_code=400)
+
+
+def login_required_response():
+    return JSONResponse(content={"error": "Sign in to use stored documents."}, status_code=401)
+
+
+async def document_text(request, upload=None, document_id=None):
+    """(doc_hash, text) from a stored document id if given, else from the uploaded PDF."""
+    if document_id:
+        document, text = await open_document(signed_in_user(request), document_id)
+        return document["doc_hash"], text
+    return await load_pdf_text(upload)
+
 # Utility to verify the current user
 def get_current_user(request: Request):
     token = request.cookies.get("token")
@@ -119,6 +379,28 @@ def get_current_user(request: Request):
             return user
     return None
 
+# Logged-in user ki users.id (saved questions ke liye), warna None
+def current_user_id(request: Request):
+    user = get_current_user(request)
+    if user and user.get("sub"):
+        row = get_user_by_google_id(user["sub"])
+        if row:
+            return row["id"]
+    return None
+
+# Gemini queue mein fair sharing ke liye user ki pehchaan
+def client_id(request: Request):
+    user = get_current_user(request)
+    if user and user.get("sub"):
+        return user["sub"]
+    return request.client.host if request.client else None
+
+# Logged-in user ka token sub, warna None. Stored documents aur token ledger isi pe: IP pe key karte
+# to ek NAT ke peeche sab ek hi quota aur kharcha share karte
+def signed_in_user(request: Request):
+    user = get_current_user(request)
+    return user["sub"] if user and user.get("sub") else None
+
 # @app.post("/userprofile")
 # async def get_profile(token: str = Depends(oauth2_scheme)):
 #     try:
@@ -139,42 +421,6 @@ def get_current_user(request: Request):
 
 
 
-# SQLite helper functions
-def init_db():
-    conn = sqlite3.connect('database.db')  # Ensure the database file name is correct
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        google_id TEXT UNIQUE,
-        name TEXT,
-        email TEXT,
-        picture_url TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_user_to_db(google_id, name, email, picture_url):
-    conn = sqlite3.connect('database.db')  # Correct database file name
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT OR IGNORE INTO users (google_id, name, email, picture_url) 
-    VALUES (?, ?, ?, ?)
-    """, (google_id, name, email, picture_url))
-    conn.commit()
-    conn.close()
-
-def fetch_user_from_db(google_id):
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT name, email, picture_url FROM users WHERE google_id = ?
-    """, (google_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
-
 @app.post("/saveUser")
 async def save_user(request: Request):
     try:
@@ -187,69 +433,165 @@ async def save_user(request: Request):
         if not user:
             return JSONResponse({"error": "Invalid token"}, status_code=401)
         
-        save_user_to_db(
-            google_id=user.get("sub"),
-            name=user.get("name"),
-            email=user.get("email"),
-            picture_url=user.get("picture")
+        await run_blocking(
+            create_user,
+            user.get("sub"),
+            user.get("name"),
+            user.get("email"),
+            user.get("picture"),
         )
         return {"message": "User data saved successfully"}
     except Exception as e:
         logging.error(f"Error in saveUser: {e}")
         return JSONResponse({"error": "Server error"}, status_code=500)
 
+def document_response(document):
+    return {
+        "document_id": document["id"],
+        "sha256": document["doc_hash"],
+        "filename": document["filename"],
+        "size": document["size"],
+        "expires_at": document["last_used_at"] + DOCUMENT_TTL,
+    }
+
+
+# PDF ek baar upload karo, phir har endpoint pe sirf document_id bhejo
+@app.post("/documents")
+async def upload_document(request: Request, pdf_file: UploadFile = File(...)):
+    owner = signed_in_user(request)
+    if owner is None:
+        return login_required_response()
+    try:
+        with stage_timer("upload_read"):
+            pdf = await spool_upload(pdf_file)
+        try:
+            # text abhi nikaal ke cache mein, baad ki calls parse nahi karengi
+            await pdf_text_for(pdf.doc_hash, pdf.source)
+            document = await run_blocking(save_document, owner, pdf, pdf_file.filename)
+        finally:
+            pdf.close()
+        return JSONResponse(content=document_response(document), status_code=201)
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except Exception as e:
+        logging.error(f"Error storing document: {e}")
+        return JSONResponse(content={"error": "Failed to store the PDF"}, status_code=500)
+
+
+@app.get("/documents/{document_id}")
+async def get_stored_document(request: Request, document_id: str):
+    owner = signed_in_user(request)
+    if owner is None:
+        return login_required_response()
+    document = await run_blocking(get_document, document_id, owner, DOCUMENT_TTL)
+    if document is None:
+        return document_not_found_response("Document not found")
+    return document_response(document)
+
+
+@app.delete("/documents/{document_id}")
+async def delete_stored_document(request: Request, document_id: str):
+    owner = signed_in_user(request)
+    if owner is None:
+        return login_required_response()
+    if not await run_blocking(delete_document, document_id, owner):
+        return document_not_found_response("Document not found")
+    return {"message": "Document deleted"}
+
+
+# Apna Gemini token kharcha: din aur endpoint ke hisaab se
+@app.get("/usage")
+async def token_usage(request: Request, days: int = 30):
+    account = signed_in_user(request)
+    if account is None:
+        return JSONResponse(content={"error": "Sign in to see your usage."}, status_code=401)
+    rows = await run_blocking(get_token_usage, account, max(1, min(days, 365)))
+    return {"usage": rows}
+
+
 @app.post("/summarize-pdf")
-async def summarize_pdf(pdfFile: UploadFile = File(...)):
+async def summarize_pdf(
+    request: Request,
+    pdfFile: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
+    stream: Optional[str] = Form(None),
+):
+    if pdfFile is None and not document_id:
+        return missing_document_response()
+    if document_id and signed_in_user(request) is None:
+        return login_required_response()
     try:
-        pdf_reader = PdfReader(pdfFile.file)
-        extracted_text = ""
-        for page in pdf_reader.pages:
-            extracted_text += page.extract_text()
-            
-        extracted_text = re.sub(r'\s+', ' ', extracted_text.strip())
-        prompt = (
-            "Summarize the following content in a concise and clear manner: "
-            + extracted_text
-        )
-        summary = model.generate_content(prompt)
+        doc_hash, extracted_text = await document_text(request, pdfFile, document_id)
+        user = client_id(request)
+
+        async def ask_gemini(section_prompt):
+            return await call_gemini_api(section_prompt, get_model(), priority=PRIORITY_INTERACTIVE, user=user)
+
+        # bade PDFs: sections parallel mein summarize karke phir combine (map-reduce);
+        # same PDF ki concurrent requests ek hi map-reduce share karti hain
+        with stage_timer("summary_map_reduce"):
+            prompt = await summary_prompts.run(doc_hash, build_summary_prompt, ask_gemini, extracted_text)
+        # stream=sse|ndjson ho to tokens aate hi bhejo, warna pura JSON
+        if stream in STREAM_FORMATS:
+            pieces = stream_gemini_api(prompt, get_model(), user=user)
+            return stream_text_response(pieces, "summary", stream)
+        summary = await ask_gemini(prompt)
         return JSONResponse(content={"summary": summary.text}, status_code=200)
+    except ServerBusy:
+        return server_busy_response()
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
     except Exception as e:
         print("Error:", e)
         return JSONResponse(content={"error": "Failed to summarize the PDF"}, status_code=500)
     
 @app.post("/askQuestion") 
 async def ask_question(
-    pdf_file: UploadFile = File(...),
+    request: Request,
+    pdf_file: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
     question: str = Form(...),
     word_limit: int = Form(...),
+    stream: Optional[str] = Form(None),
 ):
+    if pdf_file is None and not document_id:
+        return missing_document_response()
+    if document_id and signed_in_user(request) is None:
+        return login_required_response()
     try:
-        temp_dir = "uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.join(temp_dir, pdf_file.filename)
-        with open(file_path, "wb") as f:
-            f.write(await pdf_file.read())
-
-        pdf_reader = PdfReader(file_path)
-        extracted_text = ""
-        for page in pdf_reader.pages:
-            extracted_text += page.extract_text()
-
-        extracted_text = re.sub(r'\s+', ' ', extracted_text.strip())
+        # same PDF dobara aaye to parsing skip (content hash cache)
+        doc_hash, extracted_text = await document_text(request, pdf_file, document_id)
         if not extracted_text:
             raise logging.error(f"Failed to extract text from the PDF.")
+
+        # poora PDF nahi, sirf question se related chunks bhejo
+        with stage_timer("retrieval"):
+            context = await run_blocking(select_context, doc_hash, extracted_text, question)
+
+        prompt = build_answer_prompt(question, context, word_limit)
+        if stream in STREAM_FORMATS:
+            pieces = stream_gemini_api(prompt, get_model(), user=client_id(request))
+            return stream_text_response(pieces, "answer", stream)
         
         try:
-            response = call_gemini_api(f"""Give the answer of question {question} by analyzing the {extracted_text}.
-                                       Limit the answer to {word_limit} words.""", model)
+            response = await call_gemini_api(prompt, get_model(),
+                                       priority=PRIORITY_INTERACTIVE, user=client_id(request))
             answer = response.text.strip()
+        except ServerBusy:
+            raise
         except Exception as e:
             raise logging.error(f"Failed to generate an answer: {e}")
 
-        os.remove(file_path)
-
         return {"answer": answer}
 
+    except ServerBusy:
+        return server_busy_response()
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
     except Exception as e:
         return {"error": str(e)}
 
@@ -257,207 +599,346 @@ async def ask_question(
         logging.error(f"Error answering question: {e}")
         return JSONResponse(content={"error": "Error processing the question."}, status_code=500)
 
+@app.post("/askQuestions")
+async def ask_questions(
+    request: Request,
+    pdf_file: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
+    questions: List[str] = Form(...),
+    word_limit: int = Form(...),
+    stream: Optional[str] = Form(None),
+):
+    """Answers several questions about one PDF, packing them into as few Gemini calls as fit."""
+    if pdf_file is None and not document_id:
+        return missing_document_response()
+    if document_id and signed_in_user(request) is None:
+        return login_required_response()
+    questions = [question.strip() for question in questions if question.strip()]
+    if not questions or len(questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(
+            content={"error": f"Send between 1 and {BATCH_MAX_QUESTIONS} questions"}, status_code=400
+        )
+    try:
+        doc_hash, extracted_text = await document_text(request, pdf_file, document_id)
+        if not extracted_text:
+            return JSONResponse(content={"error": "Failed to extract text from the PDF."}, status_code=422)
+        user = client_id(request)
+
+        async def ask_gemini(prompt, generation_config=None):
+            return await call_gemini_api(prompt, get_model(), priority=PRIORITY_INTERACTIVE, user=user,
+                                         generation_config=generation_config)
+
+        items = answer_questions(ask_gemini, doc_hash, extracted_text, questions, word_limit)
+        # stream ho to har answer (pack) ready hote hi bhejo
+        if stream in STREAM_FORMATS:
+            return stream_items_response(items, "answers", stream)
+        answers = {index: payload async for index, payload in items}
+        return {"answers": [answers[i] for i in sorted(answers)]}
+    except ServerBusy:
+        return server_busy_response()
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
+    except Exception as e:
+        logging.error(f"Error answering questions: {e}")
+        return JSONResponse(content={"error": "Error processing the questions."}, status_code=500)
+
+
+@app.post("/summarize-pdfs")
+async def summarize_pdfs(
+    request: Request,
+    pdfFiles: Optional[List[UploadFile]] = File(None),
+    document_ids: Optional[List[str]] = Form(None),
+    stream: Optional[str] = Form(None),
+):
+    """Summarizes several PDFs; small ones share a Gemini call, large ones are map-reduced."""
+    pdfFiles = pdfFiles or []
+    document_ids = document_ids or []
+    if not pdfFiles and not document_ids:
+        return missing_document_response()
+    owner = signed_in_user(request)
+    if document_ids and owner is None:
+        return login_required_response()
+    if len(pdfFiles) + len(document_ids) > BATCH_MAX_FILES:
+        return JSONResponse(content={"error": f"Send at most {BATCH_MAX_FILES} PDFs"}, status_code=400)
+    try:
+        texts = await asyncio.gather(
+            *(load_pdf_text(pdf_file) for pdf_file in pdfFiles),
+            *(open_document(owner, document_id) for document_id in document_ids),
+        )
+        # stored documents apne upload ke filename se dikhein, id se nahi
+        names = [pdf_file.filename for pdf_file in pdfFiles]
+        names += [document["filename"] for document, _ in texts[len(pdfFiles):]]
+        documents = [(name, text) for name, (_, text) in zip(names, texts)]
+        user = client_id(request)
+
+        async def ask_gemini(prompt, generation_config=None):
+            return await call_gemini_api(prompt, get_model(), priority=PRIORITY_INTERACTIVE, user=user,
+                                         generation_config=generation_config)
+
+        items = summarize_documents(ask_gemini, documents)
+        if stream in STREAM_FORMATS:
+            return stream_items_response(items, "summaries", stream)
+        summaries = {index: payload async for index, payload in items}
+        return {"summaries": [summaries[i] for i in sorted(summaries)]}
+    except ServerBusy:
+        return server_busy_response()
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
+    except Exception as e:
+        logging.error(f"Error summarizing PDFs: {e}")
+        return JSONResponse(content={"error": "Failed to summarize the PDFs"}, status_code=500)
+
+# Question paper pipeline: pehle DB mein saved questions, jo kam padein wahi generate karo
+async def build_question_paper(doc_hash, extracted_text, topic, difficulty, question_type,
+                               total_marks, marks_per_question, user=None, user_id=None, fresh=False,
+                               progress=None):
+    question_type = question_type.lower()
+    if question_type == "mcq":
+        plan = [(marks_per_question, None, total_marks // (marks_per_question or 1))]
+    elif question_type == "theory":
+        plan = plan_theory_paper(total_marks)
+    else:
+        return []
+
+    stored = {marks: [] for marks, _, _ in plan}
+    if not fresh:
+        for marks, _, count in plan:
+            if count:
+                stored[marks] = await run_blocking(
+                    get_generated_questions, doc_hash, topic, difficulty, question_type, marks, count
+                )
+    total = sum(count for _, _, count in plan)
+
+    # background jobs ke liye partial paper publish karo
+    async def report(pending=()):
+        if progress:
+            paper = [q for marks, _, _ in plan for q in stored[marks]] + list(pending)
+            await progress(paper, min(len(paper), total), total)
+
+    if all(len(stored[marks]) >= count for marks, _, count in plan):
+        logging.info(f"Serving '{topic}' paper for {doc_hash[:12]} from stored questions")
+        return [q for marks, _, _ in plan for q in stored[marks]]
+
+    # topic ke passages local index (outline/headings + BM25) se, Gemini call nahi
+    with stage_timer("topic_extract"):
+        topic_text = await run_blocking(topic_excerpt, doc_hash, extracted_text, topic)
+    if not topic_text.strip():
+        raise Exception("Failed to find content related to the topic in the PDF.")
+    await report()
+
+    generated = []
+    generation_started = time.perf_counter()
+    for marks, word_limit, count in plan:
+        missing = count - len(stored[marks])
+        if missing <= 0:
+            continue
+        if question_type == "mcq":
+            async def ask_gemini(prompt):
+                # fresh paper pe cached response wahi purane questions de dega
+                return await call_gemini_api(
+                    prompt, get_model(), user=user, generation_config=MCQ_GENERATION_CONFIG, cache=not fresh
+                )
+
+            # saare MCQ kuch batched calls mein, ek-ek call per question nahi
+            new_questions = await generate_mcqs(
+                ask_gemini, topic, difficulty, marks, topic_text, missing,
+                existing=[q["question"] for q in stored[marks]],
+            )
+        else:
+            async def ask_gemini_uncached(prompt):
+                return await call_gemini_api(
+                    prompt, get_model(), user=user, generation_config=THEORY_GENERATION_CONFIG, cache=False
+                )
+
+            new_questions = await generate_theory_questions(
+                ask_gemini_uncached, topic, difficulty, marks, word_limit, missing, on_question=report,
+                topic_text=topic_text,
+            )
+        stored[marks].extend(new_questions)
+        generated.extend(new_questions)
+        await report()
+    observe_stage("question_generation", time.perf_counter() - generation_started)
+
+    # naye questions ek hi transaction mein save, agli baar kaam aayenge
+    await run_blocking(
+        save_generated_questions, user_id, doc_hash, topic, difficulty, question_type, generated
+    )
+    return [q for marks, _, _ in plan for q in stored[marks]]
+
+
+# Same PDF + topic + paper settings ki concurrent requests (poori class ek saath) ek hi pipeline share karein
+async def coalesced_question_paper(doc_hash, extracted_text, topic, difficulty, question_type,
+                                   total_marks, marks_per_question, fresh=False, **kwargs):
+    args = (doc_hash, extracted_text, topic, difficulty, question_type, total_marks, marks_per_question)
+    if fresh:
+        # fresh maanga hai to naye questions chahiye, kisi aur ka paper nahi
+        return await build_question_paper(*args, fresh=True, **kwargs)
+    key = (
+        doc_hash, topic.strip().lower(), difficulty.strip().lower(), question_type.strip().lower(),
+        total_marks, marks_per_question,
+    )
+    return await question_papers.run(key, build_question_paper, *args, **kwargs)
+
+
 @app.post("/analyze")
 async def analyze(
-    pdf_file: UploadFile = File(...),
+    request: Request,
+    pdf_file: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
     topic: str = Form(...),
     difficulty: str = Form(...),
     question_type: str = Form(...),
     total_marks: int = Form(...),
     marks_per_question: Optional[int] = Form(None),
+    fresh: bool = Form(False),
 ):
+    #check if file uploaded
+    if pdf_file is None and not document_id:
+        return missing_document_response()
+    if document_id and signed_in_user(request) is None:
+        return login_required_response()
     try:
-        #check if file uploaded
-        if not pdf_file:
-            return {"error": "No file uploaded."}
-
-        temp_dir = "uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.join(temp_dir, pdf_file.filename)
-        with open(file_path, "wb") as f:
-            f.write(await pdf_file.read())
-
-        pdf_reader = PdfReader(file_path)
-        extracted_text = ""
-        for page in pdf_reader.pages:
-            extracted_text += page.extract_text()
-
-        extracted_text = re.sub(r'\s+', ' ', extracted_text.strip())
-
-        #calling API
-        topic_text_response = call_gemini_api(
-            f"Extract the text related to '{topic}' from the following content: {extracted_text}", 
-            model
+        # same PDF dobara aaye to parsing skip (content hash cache)
+        doc_hash, extracted_text = await document_text(request, pdf_file, document_id)
+
+        questions = await coalesced_question_paper(
+            doc_hash, extracted_text, topic, difficulty, question_type,
+            total_marks, marks_per_question,
+            user=client_id(request),
+            user_id=await run_blocking(current_user_id, request),
+            fresh=fresh,
         )
-        
-        if not topic_text_response or not hasattr(topic_text_response, "text") or not topic_text_response.text.strip():
-            return {"error": "Failed to extract topic-related content using the Gemini model."}
-
-        topic_text = topic_text_response.text.strip()
-
-        questions = []
-
-        if question_type.lower() == "mcq":
-            num_questions = total_marks // (marks_per_question or 1)
-            
-            questions = []
-
-            for i in range(num_questions):
-                try:
-                    question_response = call_gemini_api(
-                        f"""
-                        Generate a {marks_per_question}-mark multiple-choice question on the topic '{topic}' at '{difficulty}' difficulty level.
-                        Provide 4 answer options (A, B, C, D), one of which is correct. Clearly indicate the correct answer.
-                        Ensure that one option is correct among the four and that the generated question is different from previous ones.
-                        Base it on the following content:\n\n{topic_text}.
-                        
-                        Return output in this format:
-                        Question: What is AI?
-                        A) Artificial Intelligence
-                        B) Automated Integration
-                        C) Advanced Internet
-                        D) Autonomous Input
-                        Correct Answer: A
-                        """,
-                        model
-                    )
-
-                    question_response_text = question_response.text.strip()
-                    question_lines = [line.strip() for line in question_response_text.split("\n") if line.strip()]
-
-                    # Ensure the response contains enough data
-                    if len(question_lines) < 6:
-                        logging.warning(f"Insufficient lines in question response: {question_response_text}")
-                        continue
-
-                    # Extract question, options, and correct answer
-                    question_text = question_lines[0].replace("Question:", "").strip()
-                    options = {
-                        "A": question_lines[1].split(") ", 1)[1].strip(),
-                        "B": question_lines[2].split(") ", 1)[1].strip(),
-                        "C": question_lines[3].split(") ", 1)[1].strip(),
-                        "D": question_lines[4].split(") ", 1)[1].strip(),
-                    }
-                    correct_answer = question_lines[5].replace("Correct Answer:", "").strip()
-
-                    # Validate correct answer existence in options
-                    if correct_answer not in options:
-                        logging.warning(f"Skipping question due to invalid correct answer format: {question_response_text}")
-                        continue
-
-                    # Add the structured question to the list
-                    questions.append({
-                        "question": question_text,
-                        "options": options,
-                        "correctAnswer": correct_answer,
-                        "marks": marks_per_question
-                    })
-
-                except Exception as e:
-                    logging.error(f"Error generating MCQ: {e}")
-                    continue
-
-
-            # use the web search if it is needed
-            while len(questions) < num_questions:
-                try:
-                    web_question_response = call_gemini_api(
-                        f"""
-                        Search the web for content on the topic '{topic}' at '{difficulty}' difficulty level.
-                        Generate a {marks_per_question}-mark multiple-choice question. 
-                        Provide 4 answer options, one of which is correct. Clearly indicate the correct answer.
-                        make sure the options of the question must contain one correct option out of 4 option
-                        also the question generated must be different from the previous ones.
-                        """,
-                        model
-                    )
-
-                    if not web_question_response or not hasattr(web_question_response, "text") or not web_question_response.text.strip():
-                        logging.warning("Failed to generate MCQ via web search.")
-                        break
-
-                    web_question_response_text = web_question_response.text.strip()
-                    question_lines = web_question_response_text.split('\n')
-                    correct_option = call_gemini_api(f"extract line which contain correct word from {question_lines}", model)
-                    # check the question structure
-                    if len(question_lines) < 5:
-                        logging.warning(f"Insufficient lines in web question response: {web_question_response_text}")
-                        continue
-
-                    question = question_lines[0]
-                    options = question_lines[1:5]
-                    correct_answer_lines = correct_option.text.strip()
-                    correct_answer = correct_answer_lines[0]
-
-                    questions.append({
-                        "question": web_question_response.text.strip(),
-                        "options": options,
-                        "correctAnswer": correct_answer,
-                        "marks": marks_per_question
-                    })
-                except Exception as e:
-                    logging.error(f"Error generating fallback MCQ: {e}")
-                    break
-
-        elif question_type.lower() == "theory":
-            marks_distribution = [
-                (4, 150),  # 4-mark questions, 150 words
-                (8, 250),  # 8-mark questions, 250 words
-                (2, 60),   # 2-mark questions, 60 words
-                (1, 30),   # 1-mark questions, 30 words
-            ]
-            remaining_marks = total_marks
-            for marks, word_limit in marks_distribution:
-                num_questions = remaining_marks // marks
-                remaining_marks -= num_questions * marks
-
-                for _ in range(num_questions):
-                    try:
-                        response = call_gemini_api(f"""
-                            Generate a concise theory question worth {marks} marks on the topic "{topic}" 
-                            with difficulty level "{difficulty}". Avoid unnecessary details.
-                            
-                            Then, generate a well-structured answer within {word_limit} words. 
-                            The answer should be clear, relevant, and informative but should not exceed the word limit.
-                            
-                            Format:
-                            Question: <concise question here>
-                            Answer: <answer within {word_limit} words>
-                        """, model)
-
-                        if response and response.text.strip():
-                            # Extract question and answer from response
-                            lines = response.text.strip().split("\n")
-                            question = ""
-                            answer = ""
-                            collecting_answer = False
-
-                            for line in lines:
-                                if line.lower().startswith("question:"):
-                                    question = line.replace("Question:", "").strip()
-                                elif line.lower().startswith("answer:"):
-                                    collecting_answer = True
-                                    answer = line.replace("Answer:", "").strip()
-                                elif collecting_answer:
-                                    answer += " " + line.strip()
-
-                            if question and answer:
-                                questions.append({
-                                    "question": question,
-                                    "marks": marks,
-                                    "word_limit": word_limit,
-                                    "correctAnswer": answer
-                                })
-                    except Exception as e:
-                        logging.warning(f"Error generating theory question: {e}")
-
-        os.remove(file_path)
         return {"questions": questions}
 
+    except ServerBusy:
+        return server_busy_response()
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
     except Exception as e:
         logging.error(f"Error during analysis: {e}")
         return {"error": str(e)}
 
+async def run_analysis_job(params, progress):
+    current_endpoint.set("/analyze/jobs")
+    current_account.set(params.get("account"))
+    extracted_text = await load_document_text(params["doc_hash"])
+    return await coalesced_question_paper(
+        params["doc_hash"], extracted_text, params["topic"], params["difficulty"],
+        params["question_type"], params["total_marks"], params["marks_per_question"],
+        user=params["user"], user_id=params["user_id"], fresh=params["fresh"],
+        progress=progress,
+    )
+
+
+# Bade papers background mein: POST turant job id deta hai, client poll/subscribe kare
+analysis_jobs = JobWorkerPool("analyze", run_analysis_job)
+
+
+def job_response(job):
+    body = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": {"done": job["progress_done"], "total": job["progress_total"]},
+        "questions": job["result"] or [],
+    }
+    if job["error"]:
+        body["error"] = job["error"]
+    return body
+
+
+@app.post("/analyze/jobs")
+async def submit_analysis_job(
+    request: Request,
+    pdf_file: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
+    topic: str = Form(...),
+    difficulty: str = Form(...),
+    question_type: str = Form(...),
+    total_marks: int = Form(...),
+    marks_per_question: Optional[int] = Form(None),
+    fresh: bool = Form(False),
+):
+    if question_type.lower() not in ("mcq", "theory"):
+        return JSONResponse(content={"error": "question_type must be 'mcq' or 'theory'"}, status_code=400)
+    if pdf_file is None and not document_id:
+        return missing_document_response()
+    if document_id and signed_in_user(request) is None:
+        return login_required_response()
+    try:
+        # text abhi extract karke cache mein, worker doc_hash se utha lega
+        doc_hash, _ = await document_text(request, pdf_file, document_id)
+        job_id = await analysis_jobs.submit({
+            "doc_hash": doc_hash,
+            "topic": topic,
+            "difficulty": difficulty,
+            "question_type": question_type,
+            "total_marks": total_marks,
+            "marks_per_question": marks_per_question,
+            "user": client_id(request),
+            "account": signed_in_user(request),
+            "user_id": await run_blocking(current_user_id, request),
+            "fresh": fresh,
+        })
+        return JSONResponse(
+            content={"job_id": job_id, "status": "queued", "status_url": f"/analyze/jobs/{job_id}"},
+            status_code=202,
+        )
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except DocumentNotFound as e:
+        return document_not_found_response(e)
+    except ServerBusy:
+        return server_busy_response()
+    except Exception as e:
+        logging.error(f"Error queueing analysis: {e}")
+        return JSONResponse(content={"error": "Failed to queue the analysis"}, status_code=500)
+
+
+@app.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    job = await run_blocking(get_job, job_id)
+    if job is None or job["kind"] != "analyze":
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    return job_response(job)
+
+
+@app.get("/analyze/jobs/{job_id}/events")
+async def analysis_job_events(job_id: str, stream: str = "sse"):
+    """Pushes a `progress` event whenever the job advances, then `done` or `error`."""
+    if stream not in STREAM_FORMATS:
+        return JSONResponse(content={"error": f"stream must be one of {', '.join(STREAM_FORMATS)}"}, status_code=400)
+    job = await run_blocking(get_job, job_id)
+    if job is None or job["kind"] != "analyze":
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+
+    async def events(job):
+        last_seen = None
+        while True:
+            seen = (job["status"], job["progress_done"])
+            if seen != last_seen:
+                last_seen = seen
+                if job["status"] == "done":
+                    yield encode_event(stream, job_response(job), event="done")
+                    return
+                if job["status"] == "failed":
+                    yield encode_event(stream, job_response(job), event="error")
+                    return
+                yield encode_event(stream, job_response(job), event="progress")
+            await asyncio.sleep(1)
+            job = await run_blocking(get_job, job_id)
+            if job is None:
+                yield encode_event(stream, {"error": "Job not found"}, event="error")
+                return
+
+    return event_stream_response(events(job), stream)
+
+
 if __name__ == "__main__":
-    init_db()
+    initialize_db()
     uvicorn.run(app, host="localhost", port=8080, reload=True)
\ No newline at end of file
@@ -1,26 +0,0 @@
-import sqlite3
-
-DB_NAME = "database.db"
-
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def create_tables():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        uid TEXT UNIQUE NOT NULL,
-        name TEXT,
-        email TEXT UNIQUE,
-        profile_pic TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-# Initialize database tables
-create_tables()
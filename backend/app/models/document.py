@@ -0,0 +1,105 @@
+import time
+import uuid
+from app.utils.database import db_connection
+
+DOCUMENT_FIELDS = ("id", "doc_hash", "filename", "size", "created_at", "last_used_at")
+
+def add_document(owner, doc_hash, filename, size, max_count, max_bytes):
+    """Registers an uploaded PDF for `owner` and returns (document, evicted_ids).
+
+    Re-uploading the same content returns the existing handle. To stay within
+    the owner's quota, their least recently used documents are dropped first.
+    """
+    now = time.time()
+    with db_connection() as conn, conn:
+        # quota check aur insert ek hi write transaction mein
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(f"""
+        UPDATE documents SET last_used_at = ? WHERE owner = ? AND doc_hash = ?
+        RETURNING {", ".join(DOCUMENT_FIELDS)};
+        """, (now, owner, doc_hash)).fetchall()
+        if rows:
+            return dict(rows[0]), []
+
+        owned = conn.execute("""
+        SELECT id, size FROM documents WHERE owner = ? ORDER BY last_used_at DESC;
+        """, (owner,)).fetchall()
+        count, used = 1, size
+        evicted = []
+        for document in owned:
+            if count + 1 > max_count or used + document["size"] > max_bytes:
+                evicted.append(document["id"])
+            else:
+                count += 1
+                used += document["size"]
+        if evicted:
+            conn.executemany("DELETE FROM documents WHERE id = ?;", [(doc_id,) for doc_id in evicted])
+
+        document = {
+            "id": uuid.uuid4().hex, "doc_hash": doc_hash, "filename": filename,
+            "size": size, "created_at": now, "last_used_at": now,
+        }
+        conn.execute("""
+        INSERT INTO documents (id, owner, doc_hash, filename, size, created_at, last_used_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+        """, (document["id"], owner, doc_hash, filename, size, now, now))
+    return document, evicted
+
+def use_document(doc_id, owner, ttl):
+    """Returns the owner's document and marks it used, or None if unknown or expired."""
+    now = time.time()
+    with db_connection() as conn, conn:
+        rows = conn.execute(f"""
+        UPDATE documents SET last_used_at = ?
+        WHERE id = ? AND owner = ? AND last_used_at > ?
+        RETURNING {", ".join(DOCUMENT_FIELDS)};
+        """, (now, doc_id, owner, now - ttl)).fetchall()
+    return dict(rows[0]) if rows else None
+
+def get_document(doc_id, owner, ttl):
+    """Fetches the owner's document without touching it, or None."""
+    with db_connection() as conn:
+        row = conn.execute(f"""
+        SELECT {", ".join(DOCUMENT_FIELDS)} FROM documents
+        WHERE id = ? AND owner = ? AND last_used_at > ?;
+        """, (doc_id, owner, time.time() - ttl)).fetchone()
+    return dict(row) if row else None
+
+def delete_document(doc_id, owner):
+    """Deletes the owner's handle; the blob goes once nothing references it."""
+    with db_connection() as conn, conn:
+        return conn.execute(
+            "DELETE FROM documents WHERE id = ? AND owner = ?;", (doc_id, owner)
+        ).rowcount > 0
+
+def purge_unused_documents(ttl):
+    """Deletes handles not used for `ttl` seconds; returns how many were removed."""
+    with db_connection() as conn, conn:
+        return conn.execute(
+            "DELETE FROM documents WHERE last_used_at <= ?;", (time.time() - ttl,)
+        ).rowcount
+
+def evict_documents_over(max_bytes):
+    """Drops whole blobs, least recently used first, until the distinct
+    content referenced fits in `max_bytes`; returns the evicted hashes."""
+    with db_connection() as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        blobs = conn.execute("""
+        SELECT doc_hash, MAX(size) AS size FROM documents
+        GROUP BY doc_hash ORDER BY MAX(last_used_at) ASC;
+        """).fetchall()
+        total = sum(blob["size"] for blob in blobs)
+        evicted = []
+        for blob in blobs:
+            if total <= max_bytes:
+                break
+            evicted.append(blob["doc_hash"])
+            total -= blob["size"]
+        if evicted:
+            conn.executemany("DELETE FROM documents WHERE doc_hash = ?;", [(h,) for h in evicted])
+    return evicted
+
+def referenced_hashes():
+    """Content hashes that at least one document still points at."""
+    with db_connection() as conn:
+        return {row["doc_hash"] for row in conn.execute("SELECT DISTINCT doc_hash FROM documents;")}
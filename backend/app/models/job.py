@@ -0,0 +1,105 @@
+import json
+import time
+import uuid
+from app.utils.database import db_connection
+
+# queued -> running -> done | failed
+JOB_FIELDS = (
+    "id", "kind", "status", "result", "error", "progress_done", "progress_total",
+    "created_at", "updated_at", "expires_at",
+)
+
+def create_job(kind, params):
+    """Queues a job and returns its id."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with db_connection() as conn, conn:
+        conn.execute("""
+        INSERT INTO jobs (id, kind, status, params, created_at, updated_at)
+        VALUES (?, ?, 'queued', ?, ?, ?);
+        """, (job_id, kind, json.dumps(params), now, now))
+    return job_id
+
+def claim_job(kind, stale_after):
+    """Marks the oldest queued job (or a running one with no heartbeat for
+    `stale_after` seconds) as running and returns it, or None.
+
+    A single UPDATE, so workers in different processes never claim the same job.
+    """
+    now = time.time()
+    with db_connection() as conn, conn:
+        rows = conn.execute("""
+        UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE kind = ? AND (status = 'queued' OR (status = 'running' AND updated_at < ?))
+            ORDER BY created_at LIMIT 1
+        )
+        RETURNING id, params, attempts;
+        """, (now, kind, now - stale_after)).fetchall()
+    if not rows:
+        return None
+    return {"id": rows[0]["id"], "params": json.loads(rows[0]["params"]), "attempts": rows[0]["attempts"]}
+
+def update_job_progress(job_id, partial, done, total):
+    """Saves partial results; also the worker's heartbeat."""
+    with db_connection() as conn, conn:
+        conn.execute("""
+        UPDATE jobs SET result = ?, progress_done = ?, progress_total = ?, updated_at = ?
+        WHERE id = ? AND status = 'running';
+        """, (json.dumps(partial), done, total, time.time(), job_id))
+
+def heartbeat_job(job_id):
+    """Marks a running job as still alive so other workers don't reclaim it."""
+    with db_connection() as conn, conn:
+        conn.execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running';", (time.time(), job_id)
+        )
+
+def finish_job(job_id, result, ttl):
+    now = time.time()
+    with db_connection() as conn, conn:
+        conn.execute("""
+        UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ?, expires_at = ?
+        WHERE id = ?;
+        """, (json.dumps(result), now, now + ttl, job_id))
+
+def fail_job(job_id, error, ttl):
+    """Marks a job failed; partial results saved so far are kept."""
+    now = time.time()
+    with db_connection() as conn, conn:
+        conn.execute("""
+        UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, expires_at = ?
+        WHERE id = ?;
+        """, (error, now, now + ttl, job_id))
+
+def requeue_job(job_id):
+    """Puts a job back in the queue (shutdown, or the Gemini queue was full).
+
+    Doesn't count as an attempt; only jobs abandoned by a dead worker do.
+    """
+    with db_connection() as conn, conn:
+        conn.execute("""
+        UPDATE jobs SET status = 'queued', attempts = attempts - 1, updated_at = ?
+        WHERE id = ? AND status = 'running';
+        """, (time.time(), job_id))
+
+def get_job(job_id):
+    """Fetches a job with decoded results, or None if it doesn't exist or has expired."""
+    with db_connection() as conn:
+        row = conn.execute(f"""
+        SELECT {", ".join(JOB_FIELDS)} FROM jobs
+        WHERE id = ? AND (expires_at IS NULL OR expires_at > ?);
+        """, (job_id, time.time())).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def purge_expired_jobs():
+    """Deletes finished jobs past their TTL; returns how many were removed."""
+    with db_connection() as conn, conn:
+        return conn.execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?;", (time.time(),)
+        ).rowcount
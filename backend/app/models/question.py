@@ -1,27 +1,139 @@
-from app.config.sqliteConfig import get_db
+import base64
+import json
+from app.utils.database import db_connection
+
+# GET /questions mein projection ke liye allowed columns
+QUESTION_FIELDS = (
+    "id", "user_id", "question", "options", "correct_answer", "created_at",
+    "doc_hash", "topic", "difficulty", "question_type", "marks", "word_limit",
+)
 
 def add_question(user_id, question, options, correct_answer):
     """Adds a question to the database."""
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    INSERT INTO questions (user_id, question, options, correct_answer)
-    VALUES (?, ?, ?, ?);
-    """, (user_id, question, options, correct_answer))
-
-    conn.commit()
-    conn.close()
+    with db_connection() as conn, conn:
+        conn.execute("""
+        INSERT INTO questions (user_id, question, options, correct_answer)
+        VALUES (?, ?, ?, ?);
+        """, (user_id, question, options, correct_answer))
 
 def get_questions_by_user(user_id):
     """Fetches all questions for a specific user."""
-    conn = get_db()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        return conn.execute("""
+        SELECT * FROM questions WHERE user_id = ? ORDER BY created_at DESC;
+        """, (user_id,)).fetchall()
+
+def encode_cursor(created_at, question_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, question_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    created_at, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return created_at, int(question_id)
+
+def get_questions_page(user_id, limit, cursor=None, fields=None, topic=None, question_type=None):
+    """Fetches one page of a user's questions, newest first, using keyset pagination.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    selected = list(fields or QUESTION_FIELDS)
+    for key in ("created_at", "id"):
+        if key not in selected:
+            selected.append(key)  # cursor ke liye hamesha chahiye
+
+    where = ["user_id = ?"]
+    params = [user_id]
+    if topic:
+        where.append("topic = ?")
+        params.append(topic.strip().lower())
+    if question_type:
+        where.append("question_type = ?")
+        params.append(question_type.strip().lower())
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    with db_connection() as conn:
+        rows = conn.execute(f"""
+        SELECT {", ".join(selected)} FROM questions
+        WHERE {" AND ".join(where)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?;
+        """, (*params, limit + 1)).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    wanted = fields or QUESTION_FIELDS
+    return [{key: row[key] for key in wanted} for row in rows], next_cursor
+
+def iter_questions_by_user(user_id, fields=None, topic=None, question_type=None, batch_size=500):
+    """Yields all of a user's questions page by page, without loading them all at once."""
+    cursor = None
+    while True:
+        rows, cursor = get_questions_page(user_id, batch_size, cursor, fields, topic, question_type)
+        yield from rows
+        if cursor is None:
+            break
+
+def _paper_key(topic, difficulty, question_type):
+    return topic.strip().lower(), difficulty.strip().lower(), question_type.strip().lower()
+
+def save_generated_questions(user_id, doc_hash, topic, difficulty, question_type, questions):
+    """Saves a generated paper's questions in one transaction.
+
+    A question the user already has for the same paper settings is skipped;
+    other users' copies don't count, since each user keeps their own history.
+    """
+    if not questions:
+        return
+    topic, difficulty, question_type = _paper_key(topic, difficulty, question_type)
+    rows = [
+        (
+            user_id,
+            q["question"],
+            json.dumps(q["options"]) if "options" in q else None,
+            q.get("correctAnswer"),
+            doc_hash,
+            topic,
+            difficulty,
+            question_type,
+            q.get("marks"),
+            q.get("word_limit"),
+        )
+        for q in questions
+    ]
+    with db_connection() as conn, conn:
+        # idx_questions_paper_question se lookup; unique constraint nahi, taaki kisi user ki history na kate
+        conn.executemany("""
+        INSERT INTO questions (user_id, question, options, correct_answer, doc_hash,
+                               topic, difficulty, question_type, marks, word_limit)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10
+        WHERE NOT EXISTS (
+            SELECT 1 FROM questions
+            WHERE doc_hash = ?5 AND question_type = ?8 AND topic = ?6 AND difficulty = ?7
+              AND marks IS ?9 AND question = ?2 AND user_id IS ?1
+        );
+        """, rows)
 
-    cursor.execute("""
-    SELECT * FROM questions WHERE user_id = ? ORDER BY created_at DESC;
-    """, (user_id,))
-    questions = cursor.fetchall()
-    conn.close()
+def get_generated_questions(doc_hash, topic, difficulty, question_type, marks, limit):
+    """Fetches up to `limit` stored questions generated for the same document and settings."""
+    topic, difficulty, question_type = _paper_key(topic, difficulty, question_type)
+    with db_connection() as conn:
+        rows = conn.execute("""
+        SELECT * FROM (
+            SELECT DISTINCT question, options, correct_answer, marks, word_limit FROM questions
+            WHERE doc_hash = ? AND question_type = ? AND topic = ? AND difficulty = ? AND marks IS ?
+        )
+        ORDER BY RANDOM() LIMIT ?;
+        """, (doc_hash, question_type, topic, difficulty, marks, limit)).fetchall()
 
+    questions = []
+    for row in rows:
+        question = {"question": row["question"], "marks": row["marks"], "correctAnswer": row["correct_answer"]}
+        if row["options"] is not None:
+            question["options"] = json.loads(row["options"])
+        if row["word_limit"] is not None:
+            question["word_limit"] = row["word_limit"]
+        questions.append(question)
     return questions
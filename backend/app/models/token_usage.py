@@ -0,0 +1,27 @@
+import time
+from app.utils.database import db_connection
+
+def record_token_usage(user, endpoint, prompt_tokens, output_tokens, reserved_tokens):
+    """Adds one Gemini call to today's (UTC) ledger row for the user and endpoint."""
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    with db_connection() as conn, conn:
+        conn.execute("""
+        INSERT INTO token_usage (day, user, endpoint, requests, prompt_tokens, output_tokens, reserved_tokens)
+        VALUES (?, ?, ?, 1, ?, ?, ?)
+        ON CONFLICT (day, user, endpoint) DO UPDATE SET
+            requests = requests + 1,
+            prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+            output_tokens = output_tokens + excluded.output_tokens,
+            reserved_tokens = reserved_tokens + excluded.reserved_tokens;
+        """, (day, user or "", endpoint or "", prompt_tokens, output_tokens, reserved_tokens))
+
+def get_token_usage(user, days=30):
+    """The user's ledger rows for the last `days` days, newest first."""
+    since = time.strftime("%Y-%m-%d", time.gmtime(time.time() - days * 24 * 60 * 60))
+    with db_connection() as conn:
+        rows = conn.execute("""
+        SELECT day, endpoint, requests, prompt_tokens, output_tokens, reserved_tokens
+        FROM token_usage WHERE user = ? AND day > ?
+        ORDER BY day DESC, endpoint;
+        """, (user or "", since)).fetchall()
+    return [dict(row) for row in rows]
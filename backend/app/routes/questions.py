@@ -1,5 +1,10 @@
-from fastapi import APIRouter, Depends
-from app.models.question import add_question, get_questions_by_user
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.models.question import (
+    QUESTION_FIELDS, add_question, get_questions_page, iter_questions_by_user,
+)
 
 router = APIRouter()
 
@@ -9,8 +14,41 @@ def create_question(user_id: int, question: str, options: str, correct_answer: s
     add_question(user_id, question, options, correct_answer)
     return {"message": "Question created successfully"}
 
+def _stream_questions(rows):
+    # bade exports ko ek saath memory mein banaye bina JSON array stream karo
+    yield '{"questions": ['
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row)
+    yield "]}"
+
 @router.get("/questions/{user_id}")
-def get_user_questions(user_id: int):
-    """Get all questions for a specific user."""
-    questions = get_questions_by_user(user_id)
-    return {"questions": [dict(q) for q in questions]}
+def get_user_questions(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    topic: Optional[str] = None,
+    question_type: Optional[str] = None,
+    export: bool = False,
+):
+    """Get a user's questions, newest first, one page at a time.
+
+    Pass the returned `next_cursor` as `cursor` for the next page, `fields`
+    (comma separated) to pick columns, and `export=true` to stream all of them.
+    """
+    selected = None
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in QUESTION_FIELDS]
+        if unknown:
+            return JSONResponse({"error": f"Unknown fields: {', '.join(unknown)}"}, status_code=400)
+
+    if export:
+        rows = iter_questions_by_user(user_id, selected, topic, question_type)
+        return StreamingResponse(_stream_questions(rows), media_type="application/json")
+
+    try:
+        questions, next_cursor = get_questions_page(user_id, limit, cursor, selected, topic, question_type)
+    except (ValueError, TypeError):
+        return JSONResponse({"error": "Invalid cursor"}, status_code=400)
+    return {"questions": questions, "next_cursor": next_cursor}
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+
+from app.utils.executor import ServerBusy, run_blocking
+from app.utils.question_generator import STRUCTURED_OUTPUT, load_json
+from app.utils.retrieval import get_index, join_chunks, select_chunk_ids
+from app.utils.summarizer import SUMMARY_DIRECT_WORDS, build_summary_prompt
+
+# Ek packed Gemini call ki limits: items, prompt words aur expected output words
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "8"))
+BATCH_MAX_PROMPT_WORDS = int(os.getenv("BATCH_MAX_PROMPT_WORDS", "12000"))
+BATCH_MAX_OUTPUT_WORDS = int(os.getenv("BATCH_MAX_OUTPUT_WORDS", "3000"))
+# Ek request mein kitne questions / PDFs
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "20"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10"))
+# Ek summary ke liye kitne output words maan ke chalein
+_SUMMARY_WORDS = 250
+
+ANSWERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "answers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "answer": {"type": "string"}},
+                "required": ["id", "answer"],
+            },
+        },
+    },
+    "required": ["answers"],
+}
+SUMMARIES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summaries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "summary": {"type": "string"}},
+                "required": ["id", "summary"],
+            },
+        },
+    },
+    "required": ["summaries"],
+}
+ANSWERS_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": ANSWERS_SCHEMA} if STRUCTURED_OUTPUT else None
+SUMMARIES_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": SUMMARIES_SCHEMA} if STRUCTURED_OUTPUT else None
+
+
+def build_answer_prompt(question, context, word_limit):
+    """The single-question prompt (shared with /askQuestion, so cached answers are reused)."""
+    return f"""Give the answer of question {question} by analyzing the {context}.
+                                       Limit the answer to {word_limit} words."""
+
+
+def build_answers_prompt(questions, context, word_limit):
+    numbered = "\n".join(f"{n}. {question}" for n, question in enumerate(questions, start=1))
+    return f"""Answer each of the following questions by analyzing the content below.
+    Limit every answer to {word_limit} words and answer every question separately.
+
+    Questions:
+    {numbered}
+
+    Content:
+    {context}
+
+    Return JSON: {{"answers": [{{"id": <question number>, "answer": "<answer>"}}]}}
+    """
+
+
+def build_summaries_prompt(texts):
+    documents = "\n\n".join(f"Document {n}:\n{text}" for n, text in enumerate(texts, start=1))
+    return f"""Summarize each of the following documents separately in a concise and clear manner.
+
+    {documents}
+
+    Return JSON: {{"summaries": [{{"id": <document number>, "summary": "<summary>"}}]}}
+    """
+
+
+def parse_numbered(text, list_key, value_key, count):
+    """Returns {item number: text} from a packed JSON response; items that are missing or empty are left out."""
+    data = load_json(text)
+    if isinstance(data, dict):
+        data = data.get(list_key)
+    if not isinstance(data, list):
+        return {}
+    results = {}
+    for position, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("id", position))
+        except (TypeError, ValueError):
+            number = position
+        value = item.get(value_key)
+        if 1 <= number <= count and isinstance(value, str) and value.strip():
+            results[number] = value.strip()
+    return results
+
+
+def pack(items, size, output_size):
+    """Greedily groups items, in order, into packs within the batch limits.
+
+    `size(pack_items)` is the prompt size in words of a candidate pack, and
+    `output_size(item)` the expected answer length in words.
+    """
+    packs = []
+    current = []
+    output = 0
+    for item in items:
+        candidate = current + [item]
+        if current and (
+            len(candidate) > BATCH_MAX_ITEMS
+            or size(candidate) > BATCH_MAX_PROMPT_WORDS
+            or output + output_size(item) > BATCH_MAX_OUTPUT_WORDS
+        ):
+            packs.append(current)
+            candidate, output = [item], 0
+        current = candidate
+        output += output_size(item)
+    if current:
+        packs.append(current)
+    return packs
+
+
+async def _completed(tasks):
+    """Yields each task's list of (index, payload) results as soon as it finishes."""
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for result in await next_done:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _call_text(call, prompt, generation_config=None):
+    response = await call(prompt, generation_config)
+    if response is None or not getattr(response, "text", "").strip():
+        raise Exception("Empty response from Gemini")
+    return response.text.strip()
+
+
+async def answer_questions(call, doc_hash, text, questions, word_limit):
+    """Answers several questions about one document in as few Gemini calls as fit.
+
+    Context for each question is picked from the shared retrieval index;
+    questions are packed together with the union of their passages. Yields
+    `(index, {"question", "answer"} or {"question", "error"})` as each pack
+    finishes. `call(prompt, generation_config)` returns a Gemini response.
+    """
+    chunk_ids = await asyncio.gather(
+        *(run_blocking(select_chunk_ids, doc_hash, text, question) for question in questions)
+    )
+    whole_words = len(text.split())
+    chunk_words = []
+    if any(ids is not None for ids in chunk_ids):
+        chunk_words = [len(chunk.split()) for chunk in get_index(doc_hash, text).chunks]
+
+    def context_ids(pack_items):
+        ids = set()
+        for index in pack_items:
+            if chunk_ids[index] is None:
+                return None
+            ids.update(chunk_ids[index])
+        return ids
+
+    def size(pack_items):
+        ids = context_ids(pack_items)
+        context = whole_words if ids is None else sum(chunk_words[i] for i in ids)
+        return context + sum(len(questions[i].split()) for i in pack_items)
+
+    def context_for(pack_items):
+        ids = context_ids(pack_items)
+        return text if ids is None else join_chunks(doc_hash, text, ids)
+
+    async def answer_one(index):
+        try:
+            prompt = build_answer_prompt(questions[index], context_for([index]), word_limit)
+            return index, {"question": questions[index], "answer": await _call_text(call, prompt)}
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logging.warning(f"Failed to answer batched question {index}: {e}")
+            return index, {"question": questions[index], "error": "Failed to generate an answer"}
+
+    async def answer_pack(pack_items):
+        if len(pack_items) == 1:
+            return [await answer_one(pack_items[0])]
+        answers = {}
+        try:
+            prompt = build_answers_prompt([questions[i] for i in pack_items], context_for(pack_items), word_limit)
+            answers = parse_numbered(
+                await _call_text(call, prompt, ANSWERS_GENERATION_CONFIG), "answers", "answer", len(pack_items)
+            )
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logging.warning(f"Packed answer call failed, answering one by one: {e}")
+        results = [
+            (index, {"question": questions[index], "answer": answers[n]})
+            for n, index in enumerate(pack_items, start=1)
+            if n in answers
+        ]
+        # jo answers pack mein nahi aaye, unhe alag se poocho
+        missing = [index for n, index in enumerate(pack_items, start=1) if n not in answers]
+        results.extend(await asyncio.gather(*(answer_one(index) for index in missing)))
+        return results
+
+    packs = pack(list(range(len(questions))), size, lambda index: word_limit)
+    tasks = [asyncio.ensure_future(answer_pack(pack_items)) for pack_items in packs]
+    async for result in _completed(tasks):
+        yield result
+
+
+async def summarize_documents(call, documents):
+    """Summarizes several documents, packing the small ones into shared Gemini calls.
+
+    `documents` is a list of (filename, text). Documents longer than
+    SUMMARY_DIRECT_WORDS go through the map-reduce summarizer on their own.
+    Yields `(index, {"filename", "summary"} or {"filename", "error"})` as each finishes.
+    """
+    async def ask(prompt):
+        return await call(prompt, None)
+
+    async def summarize_one(index):
+        filename, text = documents[index]
+        try:
+            if not text.strip():
+                raise Exception("No text could be extracted from the PDF")
+            prompt = await build_summary_prompt(ask, text)
+            return index, {"filename": filename, "summary": await _call_text(call, prompt)}
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logging.warning(f"Failed to summarize {filename}: {e}")
+            return index, {"filename": filename, "error": "Failed to summarize the PDF"}
+
+    async def summarize_pack(pack_items):
+        if len(pack_items) == 1:
+            return [await summarize_one(pack_items[0])]
+        summaries = {}
+        try:
+            prompt = build_summaries_prompt([documents[i][1] for i in pack_items])
+            summaries = parse_numbered(
+                await _call_text(call, prompt, SUMMARIES_GENERATION_CONFIG), "summaries", "summary", len(pack_items)
+            )
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logging.warning(f"Packed summary call failed, summarizing one by one: {e}")
+        results = [
+            (index, {"filename": documents[index][0], "summary": summaries[n]})
+            for n, index in enumerate(pack_items, start=1)
+            if n in summaries
+        ]
+        missing = [index for n, index in enumerate(pack_items, start=1) if n not in summaries]
+        results.extend(await asyncio.gather(*(summarize_one(index) for index in missing)))
+        return results
+
+    words = [len(text.split()) for _, text in documents]
+    small = [i for i in range(len(documents)) if 0 < words[i] <= SUMMARY_DIRECT_WORDS]
+    packs = pack(small, lambda pack_items: sum(words[i] for i in pack_items), lambda index: _SUMMARY_WORDS)
+    packs += [[i] for i in range(len(documents)) if i not in small]
+    tasks = [asyncio.ensure_future(summarize_pack(pack_items)) for pack_items in packs]
+    async for result in _completed(tasks):
+        yield result
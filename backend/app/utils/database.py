@@ -1,27 +1,389 @@
+import logging
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 
-DATABASE_PATH = "database.db"
+DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
+
+def _connect():
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=10,
+        check_same_thread=False,  # pool se alag threads use karte hain
+        cached_statements=256,  # prepared statements per connection reuse hote hain
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived SQLite connections."""
+
+    def __init__(self, size=DB_POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return _connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+_pool = ConnectionPool()
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+@contextmanager
+def db_connection():
+    """Borrows a pooled connection; commit with `with conn:` inside the block."""
+    ensure_migrated()
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+def close_pool():
+    _pool.close_all()
+
+
+class PeriodicPrune:
+    """Runs a cache table's `prune(conn, now)` on every `every`-th write.
+
+    Pruning scans the table, so doing it on each write would be expensive.
+    """
+
+    def __init__(self, prune, every):
+        self.prune = prune
+        self.every = every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def after_write(self, conn, now):
+        with self._lock:
+            self._writes += 1
+            if self._writes < self.every:
+                return
+            self._writes = 0
+        self.prune(conn, now)
+
+
+# --- Migrations ---------------------------------------------------------
+
+def _columns(conn, table):
+    return {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migration_1_unify_users_and_questions(conn):
+    """One users/questions schema in place of the three older variants."""
+    user_columns = _columns(conn, "users")
+    rebuild_users = bool(user_columns) and user_columns != {"id", "google_id", "name", "email", "picture_url", "created_at"}
+    if rebuild_users:
+        # purane schemas: google_id/picture_url, uid/profile_pic, ya sirf name/email
+        google_id = "google_id" if "google_id" in user_columns else ("uid" if "uid" in user_columns else "NULL")
+        picture = "picture_url" if "picture_url" in user_columns else ("profile_pic" if "profile_pic" in user_columns else "NULL")
+        conn.execute("ALTER TABLE users RENAME TO users_old")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        google_id TEXT,
+        name TEXT,
+        email TEXT UNIQUE,
+        picture_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    if rebuild_users:
+        conn.execute(f"""
+        INSERT OR IGNORE INTO users (id, google_id, name, email, picture_url)
+        SELECT id, {google_id}, name, email, {picture} FROM users_old
+        """)
+        conn.execute("DROP TABLE users_old")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_google_id ON users (google_id)")
+
+    question_columns = _columns(conn, "questions")
+    rebuild_questions = bool(question_columns) and "question" not in question_columns
+    if rebuild_questions:
+        conn.execute("ALTER TABLE questions RENAME TO questions_old")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        options TEXT,
+        correct_answer TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+    if rebuild_questions:
+        conn.execute("""
+        INSERT INTO questions (id, user_id, question)
+        SELECT id, user_id, question_text FROM questions_old
+        """)
+        conn.execute("DROP TABLE questions_old")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_user_created ON questions (user_id, created_at)")
+
+
+def _migration_2_cache_tables(conn):
+    """Tables for the PDF text cache and the Gemini response cache."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pdf_text_cache (
+        doc_hash TEXT PRIMARY KEY,
+        text TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gemini_response_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gemini_response_cache_last_used ON gemini_response_cache (last_used)"
+    )
+
+
+def _migration_3_generated_papers(conn):
+    """Questions remember their source document, topic, difficulty and type."""
+    # user_id ab optional hai (bina login ke bhi papers generate hote hain), isliye rebuild
+    conn.execute("ALTER TABLE questions RENAME TO questions_old")
+    conn.execute("""
+    CREATE TABLE questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        question TEXT NOT NULL,
+        options TEXT,
+        correct_answer TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        doc_hash TEXT,
+        topic TEXT,
+        difficulty TEXT,
+        question_type TEXT,
+        marks INTEGER,
+        word_limit INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+    conn.execute("""
+    INSERT INTO questions (id, user_id, question, options, correct_answer, created_at)
+    SELECT id, user_id, question, options, correct_answer, created_at FROM questions_old
+    """)
+    conn.execute("DROP TABLE questions_old")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_user_created ON questions (user_id, created_at)")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_questions_paper
+    ON questions (doc_hash, question_type, topic, difficulty, marks)
+    """)
+
+
+def _migration_4_question_pagination_indexes(conn):
+    """Composite indexes for keyset pagination of a user's questions."""
+    conn.execute("DROP INDEX IF EXISTS idx_questions_user_created")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_user_created_id ON questions (user_id, created_at, id)")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_questions_user_type_created
+    ON questions (user_id, question_type, created_at, id)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_questions_user_topic_created
+    ON questions (user_id, topic, created_at, id)
+    """)
+
+
+def _migration_5_jobs(conn):
+    """Table for background jobs (async /analyze) and their progress."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        params TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        progress_done INTEGER NOT NULL DEFAULT 0,
+        progress_total INTEGER,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        expires_at REAL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (kind, status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at)")
+
+
+def _migration_6_document_sections(conn):
+    """Per-document section index (PDF outline and headings) for topic lookup."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS document_sections (
+        doc_hash TEXT PRIMARY KEY,
+        sections TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _migration_7_documents(conn):
+    """Uploaded document handles pointing at content-addressed PDF blobs."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS documents (
+        id TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        doc_hash TEXT NOT NULL,
+        filename TEXT,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_owner_hash ON documents (owner, doc_hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_owner_used ON documents (owner, last_used_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash_used ON documents (doc_hash, last_used_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_used ON documents (last_used_at)")
+
+
+def _migration_8_token_usage(conn):
+    """Daily Gemini token ledger per user and endpoint."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS token_usage (
+        day TEXT NOT NULL,
+        user TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        requests INTEGER NOT NULL DEFAULT 0,
+        prompt_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        reserved_tokens INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user, endpoint)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_token_usage_user_day ON token_usage (user, day)")
+
+
+def _migration_9_pdf_text_cache_pruning(conn):
+    """Size and last-use columns so the PDF text cache can be pruned."""
+    columns = _columns(conn, "pdf_text_cache")
+    if "size" not in columns:
+        conn.execute("ALTER TABLE pdf_text_cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE pdf_text_cache SET size = length(CAST(text AS BLOB))")
+    if "last_used" not in columns:
+        conn.execute("ALTER TABLE pdf_text_cache ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        conn.execute("UPDATE pdf_text_cache SET last_used = CAST(strftime('%s', 'now') AS REAL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pdf_text_cache_last_used ON pdf_text_cache (last_used)")
+
+
+def _migration_10_generated_question_lookup(conn):
+    """Index for skipping questions a user already has for the same paper settings."""
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_questions_paper_question
+    ON questions (doc_hash, question_type, topic, difficulty, marks, question)
+    """)
+
+
+def _migration_11_drop_shared_question_unique_index(conn):
+    """Drops the unique index an earlier migration 10 put on generated questions.
+
+    It ignored user_id, so one user's paper blocked the same questions from
+    another user's history.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_questions_generated_unique")
+    # jin DBs pe purana migration 10 chal chuka hai unke paas lookup index nahi hai
+    _migration_10_generated_question_lookup(conn)
+
+
+# (version, migration) - naye migrations hamesha end mein add karo
+MIGRATIONS = [
+    (1, _migration_1_unify_users_and_questions),
+    (2, _migration_2_cache_tables),
+    (3, _migration_3_generated_papers),
+    (4, _migration_4_question_pagination_indexes),
+    (5, _migration_5_jobs),
+    (6, _migration_6_document_sections),
+    (7, _migration_7_documents),
+    (8, _migration_8_token_usage),
+    (9, _migration_9_pdf_text_cache_pruning),
+    (10, _migration_10_generated_question_lookup),
+    (11, _migration_11_drop_shared_question_unique_index),
+]
+
+
 def initialize_db():
-    conn = get_db_connection()
-    with conn:
-        conn.executescript('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            question_text TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        );
-        ''')
-    conn.close()
+    """Applies any pending migrations to DATABASE_PATH."""
+    conn = _connect()
+    try:
+        # table rebuild ke time dusre tables ke foreign keys rewrite na hon
+        conn.execute("PRAGMA foreign_keys=OFF")
+        conn.execute("PRAGMA legacy_alter_table=ON")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        conn.commit()
+        # ek time pe ek hi worker migrate kare
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            applied = {row["version"] for row in conn.execute("SELECT version FROM schema_migrations")}
+            for version, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+                logging.info(f"Applying database migration {version}: {migration.__doc__}")
+                migration(conn)
+                conn.execute("INSERT INTO schema_migrations (version) VALUES (?)", (version,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+
+
+def ensure_migrated():
+    """Runs initialize_db once per process."""
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            initialize_db()
+            _migrated = True
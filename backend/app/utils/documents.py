@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from app.models.document import (
+    add_document, evict_documents_over, purge_unused_documents, referenced_hashes, use_document,
+)
+from app.utils.executor import run_blocking
+from app.utils.pdf_cache import lookup_pdf_text, pdf_text_for
+from app.utils.pdf_text import UPLOAD_CHUNK_SIZE, UploadTooLarge
+
+# Uploaded PDFs yahan content hash ke naam se (ek content = ek file, chahe kitne users upload karein)
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+# Itni der use na hua document handle expire (seconds)
+DOCUMENT_TTL = int(os.getenv("DOCUMENT_TTL", str(7 * 24 * 60 * 60)))
+# Per user quota: documents ki ginti aur total bytes
+DOCUMENT_QUOTA_COUNT = int(os.getenv("DOCUMENT_QUOTA_COUNT", "50"))
+DOCUMENT_QUOTA_BYTES = int(os.getenv("DOCUMENT_QUOTA_BYTES", str(500 * 1024 * 1024)))
+# Poore blob store ki limit; upar jaane pe least recently used blobs hatao
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(10 * 1024 * 1024 * 1024)))
+_GC_EVERY = 300
+# Naya likha blob row insert hone se pehle GC mein na ud jaye
+_ORPHAN_GRACE = 60 * 60
+
+
+class DocumentNotFound(Exception):
+    """Raised for a document id that is unknown, expired, or owned by someone else."""
+
+
+def blob_path(doc_hash):
+    return os.path.join(BLOB_DIR, doc_hash[:2], f"{doc_hash}.pdf")
+
+
+def store_blob(pdf):
+    """Saves a spooled upload under its content hash, once; returns the blob path."""
+    path = blob_path(pdf.doc_hash)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    if pdf.path is not None:
+        try:
+            # spool file already complete hai: same filesystem pe rename hi kaafi
+            os.replace(pdf.path, path)
+            pdf.path = None
+            return path
+        except OSError:
+            pass
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if pdf.data is not None:
+                f.write(pdf.data)
+            else:
+                with open(pdf.path, "rb") as source:
+                    shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+        # atomic rename: readers ko kabhi aadhi likhi file nahi milti
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+def save_document(owner, pdf, filename):
+    """Stores a spooled upload as one of `owner`'s documents and returns the document row."""
+    if pdf.size > DOCUMENT_QUOTA_BYTES:
+        raise UploadTooLarge(f"PDF is larger than the {DOCUMENT_QUOTA_BYTES / (1024 * 1024):g} MB document quota")
+    store_blob(pdf)
+    document, evicted = add_document(
+        owner, pdf.doc_hash, filename, pdf.size, DOCUMENT_QUOTA_COUNT, DOCUMENT_QUOTA_BYTES
+    )
+    if evicted:
+        logging.info(f"Dropped {len(evicted)} least recently used documents to keep {owner} within quota")
+    return document
+
+
+async def load_document_text(doc_hash):
+    """Returns a stored document's text, re-extracting from its blob if the text cache lost it."""
+    text = await run_blocking(lookup_pdf_text, doc_hash)
+    if text is not None:
+        return text
+    path = blob_path(doc_hash)
+    if not os.path.exists(path):
+        raise DocumentNotFound("The document is no longer available; please upload it again.")
+    return await pdf_text_for(doc_hash, path)
+
+
+async def open_document(owner, document_id):
+    """Returns (document, text) for one of `owner`'s documents."""
+    document = await run_blocking(use_document, document_id, owner, DOCUMENT_TTL)
+    if document is None:
+        raise DocumentNotFound("Document not found; please upload it again.")
+    return document, await load_document_text(document["doc_hash"])
+
+
+def collect_garbage():
+    """Expires unused handles, trims the store to BLOB_STORE_MAX_BYTES and
+    deletes blobs nothing points at; returns how many blob files were removed."""
+    expired = purge_unused_documents(DOCUMENT_TTL)
+    evicted = evict_documents_over(BLOB_STORE_MAX_BYTES)
+    if expired or evicted:
+        logging.info(f"Expired {expired} document handles, evicted {len(evicted)} blobs over the store limit")
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+
+    referenced = referenced_hashes()
+    cutoff = time.time() - _ORPHAN_GRACE
+    removed = 0
+    for directory, _, files in os.walk(BLOB_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            doc_hash = name.split(".")[0]
+            if doc_hash in referenced and name.endswith(".pdf"):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def collect_garbage_forever():
+    """Runs collect_garbage every few minutes; started from the app lifespan."""
+    while True:
+        try:
+            removed = await run_blocking(collect_garbage)
+            if removed:
+                logging.info(f"Removed {removed} unreferenced document blobs")
+        except Exception as e:
+            logging.warning(f"Document garbage collection failed: {e}")
+        await asyncio.sleep(_GC_EVERY)
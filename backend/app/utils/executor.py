@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Worker pool sizes; PDF_WORKERS=0 parses in a thread instead of a process pool
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "16"))
+
+# Kitne kaam ek saath chalein, aur kitne queue mein wait karein (backpressure)
+MAX_CONCURRENT_PDF = int(os.getenv("MAX_CONCURRENT_PDF", str(max(PDF_WORKERS, 1))))
+MAX_CONCURRENT_LLM = int(os.getenv("MAX_CONCURRENT_LLM", str(LLM_WORKERS)))
+MAX_WAITING = int(os.getenv("MAX_WAITING", "64"))
+
+_pools_lock = threading.Lock()
+_process_pool = None
+_thread_pool = None
+
+
+class ServerBusy(Exception):
+    """Raised when a work queue is full and the request should be retried later."""
+
+
+class _Limiter:
+    """Async semaphore that rejects new waiters once too many are queued."""
+
+    def __init__(self, name, limit, max_waiting):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self._semaphore = None
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise ServerBusy(f"Too many pending {self.name} jobs")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+        return False
+
+
+pdf_limiter = _Limiter("pdf", MAX_CONCURRENT_PDF, MAX_WAITING)
+llm_limiter = _Limiter("llm", MAX_CONCURRENT_LLM, MAX_WAITING)
+
+
+def _get_thread_pool():
+    global _thread_pool
+    with _pools_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+        return _thread_pool
+
+
+def _get_process_pool():
+    global _process_pool
+    with _pools_lock:
+        if _process_pool is None:
+            # spawn: fork karna threads wale process mein safe nahi hai
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+async def run_cpu_bound(func, *args):
+    """Runs CPU-heavy work (PDF parsing) in the process pool without blocking the event loop."""
+    async with pdf_limiter:
+        loop = asyncio.get_running_loop()
+        pool = _get_process_pool() if PDF_WORKERS > 0 else None
+        return await loop.run_in_executor(pool, func, *args)
+
+
+async def run_blocking(func, *args):
+    """Runs short blocking work (hashing, SQLite) in the loop's default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+async def run_llm(func, *args):
+    """Runs a blocking Gemini call in the LLM thread pool, bounded by MAX_CONCURRENT_LLM."""
+    async with llm_limiter:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_thread_pool(), func, *args)
+
+
+async def run_llm_stream(func, *args):
+    """Async-iterates a blocking streaming Gemini call from the LLM thread pool."""
+    _done = object()
+    async with llm_limiter:
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        # consumer chala gaya (client disconnect) to producer agle chunk pe ruk jaye
+        stop = threading.Event()
+
+        def produce():
+            items = None
+            try:
+                items = func(*args)
+                for item in items:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                close = getattr(items, "close", None)
+                if stop.is_set() and close is not None:
+                    close()
+                loop.call_soon_threadsafe(queue.put_nowait, _done)
+
+        future = loop.run_in_executor(_get_thread_pool(), produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            await future
+
+
+def shutdown_executors():
+    global _process_pool, _thread_pool
+    with _pools_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=False, cancel_futures=True)
+            _thread_pool = None
@@ -1,36 +1,170 @@
-import firebase_admin
-from firebase_admin import credentials, auth
+import asyncio
 import logging
+import hashlib
+import re
+import threading
 import time
 import os
 import jwt
 import json
 import base64
+from collections import OrderedDict
 from dotenv import load_dotenv
 
+from app.utils.executor import run_blocking
+
 load_dotenv()
 
-firebase_b64 = os.getenv("FIREBASE_CONFIG_B64")
+_firebase_json = None
+
+
+def get_firebase_config():
+    """Decodes FIREBASE_CONFIG_B64 once; returns None if it isn't set."""
+    global _firebase_json
+    if _firebase_json is None:
+        firebase_b64 = os.getenv("FIREBASE_CONFIG_B64")
+        if not firebase_b64:
+            return None
+        # Decode the base64 string and load JSON
+        _firebase_json = json.loads(base64.b64decode(firebase_b64).decode())
+    return _firebase_json
+
+
+# Firebase ID tokens inhi public keys se sign hote hain (rotate hoti rehti hain)
+FIREBASE_JWKS_URL = os.getenv(
+    "FIREBASE_JWKS_URL",
+    "https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com",
+)
+# Offline / tests: URL ki jagah local JWKS file se keys lo
+FIREBASE_JWKS_FILE = os.getenv("FIREBASE_JWKS_FILE")
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+TOKEN_LEEWAY = 60  # seconds
+_DEFAULT_KEYS_TTL = 60 * 60
+# Background refresher itne seconds mein ek baar dekhta hai (unknown kid pe bhi isse zyada fetch nahi)
+_REFRESH_CHECK_INTERVAL = 60
+# Expiry se itna pehle hi nayi keys le aao, request path ko kabhi expired set na mile
+_REFRESH_AHEAD = 5 * 60
+
+_keys = {}  # kid -> PyJWK
+_keys_expire_at = 0.0
+_keys_lock = threading.Lock()
+_fetch_lock = threading.Lock()
+_refresh_wanted = False  # request path ne anjaana kid dekha
+
+_claims_cache = OrderedDict()  # sha256(token) -> claims
+_claims_lock = threading.Lock()
+
+
+def _max_age(cache_control):
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else _DEFAULT_KEYS_TTL
+
+
+def load_signing_keys(jwks, ttl=_DEFAULT_KEYS_TTL):
+    """Installs a JWKS dict as the signing key set (used for the local key file and tests)."""
+    global _keys, _keys_expire_at
+    key_set = jwt.PyJWKSet.from_dict(jwks)
+    with _keys_lock:
+        _keys = {key.key_id: key for key in key_set.keys}
+        _keys_expire_at = time.time() + ttl
+
+
+def _refresh_signing_keys():
+    if FIREBASE_JWKS_FILE:
+        with open(FIREBASE_JWKS_FILE) as f:
+            load_signing_keys(json.load(f), ttl=float("inf"))
+        return
+    import requests  # sirf network fetch ke liye chahiye
+    response = requests.get(FIREBASE_JWKS_URL, timeout=10)
+    response.raise_for_status()
+    # Cache-Control max-age tak keys valid hain
+    load_signing_keys(response.json(), ttl=_max_age(response.headers.get("Cache-Control")))
 
-if firebase_b64:
-    # Decode the base64 string and load JSON
-    firebase_json = json.loads(base64.b64decode(firebase_b64).decode())
 
-    # Initialize Firebase Admin SDK
-    cred = credentials.Certificate(firebase_json)
-    firebase_admin.initialize_app(cred)
-else:
-    raise ValueError("Firebase config not found in environment variables")
+def refresh_signing_keys():
+    """Fetches the signing keys; on failure the old ones stay in use.
+
+    Blocks on the network, so call it off the event loop.
+    """
+    global _refresh_wanted
+    if not _project_id():
+        return  # auth configure hi nahi hai
+    with _fetch_lock:
+        _refresh_wanted = False
+        try:
+            _refresh_signing_keys()
+        except Exception as e:
+            logging.error(f"Failed to fetch Firebase signing keys: {e}")
+
+
+async def keep_signing_keys_fresh():
+    """Refreshes the signing keys before they expire, or soon after an unknown
+    key id shows up; started from the app lifespan."""
+    while True:
+        if _refresh_wanted or time.time() >= _keys_expire_at - _REFRESH_AHEAD:
+            await run_blocking(refresh_signing_keys)
+        await asyncio.sleep(_REFRESH_CHECK_INTERVAL)
+
+
+def _signing_key(kid):
+    # request path (event loop) pe network call nahi; fetch keep_signing_keys_fresh karta hai
+    global _refresh_wanted
+    if not _keys and FIREBASE_JWKS_FILE:
+        refresh_signing_keys()  # local file padhna sasta hai
+    key = _keys.get(kid)
+    if key is None:
+        _refresh_wanted = True
+    return key
+
+
+def _remember_claims(token_key, claims):
+    with _claims_lock:
+        _claims_cache[token_key] = claims
+        while len(_claims_cache) > TOKEN_CACHE_SIZE:
+            _claims_cache.popitem(last=False)
+
+
+def _project_id():
+    return FIREBASE_PROJECT_ID or (get_firebase_config() or {}).get("project_id")
+
 
 def verify_token(id_token):
+    project_id = _project_id()
+    if not project_id:
+        logging.error("Error verifying token: Firebase project id is not configured")
+        return None
     try:
+        token_key = hashlib.sha256(id_token.encode()).digest()
+        with _claims_lock:
+            claims = _claims_cache.get(token_key)
+            if claims is not None:
+                if claims["exp"] + TOKEN_LEEWAY > time.time():
+                    _claims_cache.move_to_end(token_key)
+                    return claims
+                del _claims_cache[token_key]
+
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        key = _signing_key(kid)
+        if key is None:
+            logging.error(f"Error verifying token: unknown signing key {kid}")
+            return None
+
         decoded_token = jwt.decode(
             id_token,
-            key=os.getenv("API_KEY"),  # Replace with your actual key
+            key=key.key,
             algorithms=["RS256"],
-            options={"verify_exp": True, "verify_nbf": True},
-            leeway=60  # Add 60 seconds of leeway
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            options={"verify_exp": True, "verify_nbf": True, "require": ["exp", "iat", "sub"]},
+            leeway=TOKEN_LEEWAY  # Add 60 seconds of leeway
         )
+        if not decoded_token.get("sub"):
+            logging.error("Error verifying token: empty subject")
+            return None
+        # firebase_admin ki tarah uid bhi do (routes/auth.py isi ko padhta hai)
+        decoded_token.setdefault("uid", decoded_token["sub"])
+        _remember_claims(token_key, decoded_token)
         return decoded_token
     except jwt.ExpiredSignatureError:
         logging.error("Token expired")
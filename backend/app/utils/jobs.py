@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+
+from app.models.job import (
+    claim_job, create_job, fail_job, finish_job, heartbeat_job, purge_expired_jobs, requeue_job,
+    update_job_progress,
+)
+from app.utils.executor import ServerBusy, run_blocking
+
+# Har app worker process mein kitne jobs ek saath chalein
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs (results ke saath) kitni der rakhne hain (seconds)
+JOB_TTL = int(os.getenv("JOB_TTL", str(24 * 60 * 60)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+# Itni der heartbeat na aaye to worker mara hua maan ke job dobara chalao
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "600"))
+JOB_MAX_ATTEMPTS = 3
+_PURGE_EVERY = 60
+
+
+class JobWorkerPool:
+    """Runs queued jobs of one kind from the SQLite `jobs` table on a few asyncio workers.
+
+    `handler(params, progress)` is an async function returning the job's
+    JSON-serializable result; it may await `progress(partial, done, total)` to
+    publish partial results. Each app process runs its own pool; claiming is
+    atomic, so processes share the queue, and a job whose worker died is
+    picked up again after JOB_STALE_AFTER.
+    """
+
+    def __init__(self, kind, handler, workers=JOB_WORKERS, ttl=JOB_TTL, poll_interval=JOB_POLL_INTERVAL):
+        self.kind = kind
+        self.handler = handler
+        self.workers = workers
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._wakeup = None
+        self._tasks = []
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purger()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, params):
+        """Queues a job and returns its id without waiting for it to run."""
+        job_id = await run_blocking(create_job, self.kind, params)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await run_blocking(claim_job, self.kind, JOB_STALE_AFTER)
+            except Exception as e:
+                logging.error(f"Failed to claim a {self.kind} job: {e}")
+                job = None
+            if job is None:
+                # naya job submit ho to turant uthao, warna poll (doosre processes ke jobs)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        job_id = job["id"]
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            await run_blocking(fail_job, job_id, "Job was interrupted too many times", self.ttl)
+            return
+
+        async def progress(partial, done, total):
+            await run_blocking(update_job_progress, job_id, partial, done, total)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self.handler(job["params"], progress)
+        except asyncio.CancelledError:
+            # shutdown: job wapas queue mein, agla worker chala lega
+            await run_blocking(requeue_job, job_id)
+            raise
+        except ServerBusy:
+            await run_blocking(requeue_job, job_id)
+            await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logging.error(f"{self.kind} job {job_id} failed: {e}")
+            await run_blocking(fail_job, job_id, str(e), self.ttl)
+        else:
+            await run_blocking(finish_job, job_id, result, self.ttl)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id):
+        # lamba Gemini call bina progress ke bhi chale to job stale na dikhe
+        while True:
+            await asyncio.sleep(JOB_STALE_AFTER / 3)
+            try:
+                await run_blocking(heartbeat_job, job_id)
+            except Exception as e:
+                logging.warning(f"Failed to heartbeat {self.kind} job {job_id}: {e}")
+
+    async def _purger(self):
+        while True:
+            try:
+                removed = await run_blocking(purge_expired_jobs)
+                if removed:
+                    logging.info(f"Purged {removed} expired jobs")
+            except Exception as e:
+                logging.warning(f"Failed to purge expired jobs: {e}")
+            await asyncio.sleep(_PURGE_EVERY)
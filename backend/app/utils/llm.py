@@ -0,0 +1,192 @@
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+# Kaunsa LLM: "gemini" (default), "fake" (offline load tests) ya "package.module:ClassName"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Fake provider: per call latency (seconds, +/- jitter) aur kitne calls fail hon
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.1"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+_STREAM_CHUNK_WORDS = 8
+
+
+class LLMResponse:
+    """Minimal stand-in for a Gemini response: `.text` and `.usage_metadata`."""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class GeminiProvider:
+    """The Gemini API behind the provider interface.
+
+    Providers expose `model_name` (part of the response cache key) and a
+    blocking `generate_content(prompt, generation_config=None, stream=False)`
+    that returns an object with `.text`, or an iterator of them when streaming.
+    """
+
+    def __init__(self, model_name=GEMINI_MODEL, api_key=None):
+        # google.generativeai bhaari import hai, provider bante waqt hi load karo
+        from google.generativeai import configure, GenerativeModel
+        configure(api_key=api_key or os.getenv("API_KEY"))
+        self._model = GenerativeModel(model_name)
+        self.model_name = self._model.model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        kwargs = {}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        if stream:
+            kwargs["stream"] = True
+        return self._model.generate_content(prompt, **kwargs)
+
+
+class FakeLLMError(Exception):
+    """Injected failure from FakeProvider (FAKE_LLM_ERROR_RATE)."""
+
+
+def _words(text, count, salt):
+    """`count` words picked deterministically from `text`."""
+    pool = re.findall(r"[A-Za-z][A-Za-z\-]{2,}", text) or ["content"]
+    start = int(salt[:8], 16) % len(pool)
+    return " ".join(pool[(start + i) % len(pool)] for i in range(count))
+
+
+def fake_completion(prompt, json_output=False):
+    """Returns well-formed output for the prompt types the app sends.
+
+    The output only depends on the prompt, so the response cache behaves as
+    it would with Gemini. `json_output` mimics response_mime_type=application/json.
+    """
+    digest = hashlib.sha256(prompt.encode()).hexdigest()
+    topic_match = re.search(r"topic ['\"]([^'\"]*)['\"]", prompt)
+    topic = topic_match.group(1) if topic_match else "the topic"
+
+    mcq = re.search(r"Generate (\d+) different \d+-mark multiple-choice", prompt)
+    if mcq:
+        items = []
+        for i in range(int(mcq.group(1))):
+            salt = hashlib.sha256(f"{digest}{i}".encode()).hexdigest()
+            items.append({
+                "question": f"Which statement about {topic} matches '{_words(prompt, 4, salt)}' ({salt[:6]})?",
+                "options": {letter: _words(prompt, 3, salt[n * 8:]) for n, letter in enumerate("ABCD", start=1)},
+                "correct_answer": "ABCD"[int(salt[:2], 16) % 4],
+            })
+        if json_output:
+            return json.dumps({"questions": items})
+        return "\n\n".join(
+            "\n".join([
+                f"Question: {item['question']}",
+                *(f"{letter}) {option}" for letter, option in item["options"].items()),
+                f"Correct Answer: {item['correct_answer']}",
+            ])
+            for item in items
+        )
+
+    theory = re.search(r"theory question worth (\d+) marks", prompt)
+    if theory:
+        limit = re.search(r"within (\d+) words", prompt)
+        answer_words = min(int(limit.group(1)) if limit else 50, 400)
+        question = f"Explain {_words(prompt, 3, digest)} in the context of {topic}."
+        answer = _words(prompt, answer_words, digest[8:])
+        if json_output:
+            return json.dumps({"question": question, "answer": answer})
+        return f"Question: {question}\nAnswer: {answer}"
+
+    if prompt.startswith("Answer each of the following questions"):
+        limit = re.search(r"Limit every answer to (\d+) words", prompt)
+        questions = re.findall(r"^\s*(\d+)\. ", prompt.split("Content:")[0], re.M)
+        answers = [
+            {"id": int(n), "answer": _words(prompt, min(int(limit.group(1)) if limit else 50, 400), digest[int(n) % 32:])}
+            for n in questions
+        ]
+        return json.dumps({"answers": answers})
+    if prompt.startswith("Summarize each of the following documents"):
+        documents = re.findall(r"^\s*Document (\d+):", prompt, re.M)
+        summaries = [
+            {"id": int(n), "summary": f"This document covers {_words(prompt, 60, digest[int(n) % 32:])}."}
+            for n in documents
+        ]
+        return json.dumps({"summaries": summaries})
+
+    limit = re.search(r"Limit the answer to (\d+) words", prompt)
+    if limit:
+        return _words(prompt, min(int(limit.group(1)), 400), digest)
+    if "ummar" in prompt:  # summarize / summaries
+        return f"This document covers {_words(prompt, 60, digest)}."
+    return _words(prompt, 40, digest)
+
+
+class FakeProvider:
+    """Deterministic offline LLM for load and soak tests; spends no quota.
+
+    Sleeps `latency` +/- `jitter` seconds per call and raises FakeLLMError for
+    an `error_rate` fraction of calls, drawn from a seeded RNG.
+    """
+
+    model_name = "fake"
+
+    def __init__(self, latency=FAKE_LLM_LATENCY, jitter=FAKE_LLM_JITTER, error_rate=FAKE_LLM_ERROR_RATE,
+                 seed=FAKE_LLM_SEED):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        return delay, failed
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        delay, failed = self._draw()
+        json_output = (generation_config or {}).get("response_mime_type") == "application/json"
+        text = fake_completion(prompt, json_output)
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4,
+        )
+        if stream:
+            return self._stream(text, delay, failed)
+        time.sleep(delay)
+        if failed:
+            raise FakeLLMError("Injected fake LLM error")
+        return LLMResponse(text, usage)
+
+    def _stream(self, text, delay, failed):
+        words = text.split(" ")
+        chunks = [" ".join(words[i:i + _STREAM_CHUNK_WORDS]) for i in range(0, len(words), _STREAM_CHUNK_WORDS)]
+        for n, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            if failed and n == len(chunks) // 2:
+                raise FakeLLMError("Injected fake LLM error mid-stream")
+            yield LLMResponse(chunk + (" " if n < len(chunks) - 1 else ""))
+
+
+def create_llm_provider():
+    """Builds the provider named by LLM_PROVIDER.
+
+    "gemini" (default) calls the real API, "fake" uses FakeProvider, and
+    "package.module:ClassName" loads a custom provider built without arguments.
+    """
+    if LLM_PROVIDER == "gemini":
+        return GeminiProvider()
+    if LLM_PROVIDER == "fake":
+        return FakeProvider()
+    module_name, _, class_name = LLM_PROVIDER.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
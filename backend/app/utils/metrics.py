@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text format khud likhte hain, prometheus_client dependency nahi chahiye.
+# Values per process hain (har gunicorn worker apna /metrics deta hai).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """For collectors mirroring a count that is kept elsewhere (e.g. cache_stats)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., +Inf count], sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {total!r}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def add_collector(func):
+    """Registers a function that refreshes gauges/counters right before each scrape."""
+    _collectors.append(func)
+    return func
+
+
+def render_metrics():
+    """Runs the collectors and returns all metrics in the Prometheus text format."""
+    for collect in _collectors:
+        collect()
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- App metrics ----------------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "studify_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ["stage"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "studify_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+)
+GEMINI_REQUESTS = Counter(
+    "studify_gemini_requests_total",
+    "Gemini calls by priority and outcome (ok, cached, error, busy, limit).",
+    ["priority", "outcome"],
+)
+GEMINI_TOKENS = Counter(
+    "studify_gemini_tokens_total",
+    "Gemini tokens: reserved estimates, prompt/output usage (reported, else estimated) and reconciliation refunds/overruns.",
+    ["kind"],
+)
+GEMINI_BUDGET = Gauge(
+    "studify_gemini_budget",
+    "Configured Gemini limits (MAX_RPM, MAX_TPM, MAX_RPD).",
+    ["limit"],
+)
+GEMINI_AVAILABLE = Gauge(
+    "studify_gemini_available",
+    "Gemini budget still available in the current window.",
+    ["limit"],
+)
+TOKEN_ESTIMATE_RATIO = Gauge(
+    "studify_token_estimate_ratio",
+    "Calibration factor from the local token count to the prompt tokens Gemini reports.",
+)
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "studify_scheduler_queue_depth",
+    "Calls waiting for Gemini rate limit, by priority.",
+    ["priority"],
+)
+SCHEDULER_GRANTED = Counter("studify_scheduler_granted_total", "Calls let through by the Gemini scheduler.")
+SCHEDULER_REJECTED = Counter("studify_scheduler_rejected_total", "Calls rejected by the Gemini scheduler.")
+CACHE_LOOKUPS = Counter(
+    "studify_cache_lookups_total",
+    "Cache lookups by cache and result.",
+    ["cache", "result"],
+)
+CACHE_HIT_RATIO = Gauge(
+    "studify_cache_hit_ratio",
+    "Hits / lookups since process start.",
+    ["cache"],
+)
+COALESCED_CALLS = Counter(
+    "studify_coalesced_calls_total",
+    "Calls served by joining an identical computation already in flight, by operation.",
+    ["operation"],
+)
+EXECUTOR_WAITING = Gauge(
+    "studify_executor_waiting",
+    "Jobs waiting for a PDF or LLM worker slot.",
+    ["pool"],
+)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def stage_timer(stage):
+    """`with stage_timer("pdf_extract"): ...` records the block's duration."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def record_cache_stats(cache, hits, misses):
+    """Mirrors a cache's hit/miss counts into CACHE_LOOKUPS and CACHE_HIT_RATIO."""
+    CACHE_LOOKUPS.set_total(hits, cache=cache, result="hit")
+    CACHE_LOOKUPS.set_total(misses, cache=cache, result="miss")
+    lookups = hits + misses
+    CACHE_HIT_RATIO.set(hits / lookups if lookups else 0.0, cache=cache)
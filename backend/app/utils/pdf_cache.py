@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.database import PeriodicPrune, db_connection
+from app.utils.executor import run_blocking, run_cpu_bound
+from app.utils.metrics import stage_timer
+from app.utils.pdf_text import extract_pdf_document, spool_upload
+from app.utils.singleflight import SingleFlight
+from app.utils.topic_index import store_sections
+
+# Memory tier limits (entries aur total characters dono pe bound)
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "64"))
+PDF_CACHE_MAX_CHARS = int(os.getenv("PDF_CACHE_MAX_CHARS", str(64 * 1024 * 1024)))
+# SQLite tier: total size (bytes) aur itni der use na hua text hata do (seconds)
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+PDF_TEXT_CACHE_TTL = int(os.getenv("PDF_TEXT_CACHE_TTL", str(30 * 24 * 60 * 60)))
+
+_memory_cache = OrderedDict()
+_memory_chars = 0
+_cache_lock = threading.Lock()
+
+cache_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+_extractions = SingleFlight("pdf_extract")
+_EXTRACT_ATTEMPTS = 3
+
+
+def _remember(doc_hash, text):
+    global _memory_chars
+    with _cache_lock:
+        if doc_hash in _memory_cache:
+            _memory_cache.move_to_end(doc_hash)
+            return
+        _memory_cache[doc_hash] = text
+        _memory_chars += len(text)
+        while _memory_cache and (
+            len(_memory_cache) > PDF_CACHE_SIZE or _memory_chars > PDF_CACHE_MAX_CHARS
+        ):
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_chars -= len(evicted)
+
+
+def _load_from_db(doc_hash):
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT text FROM pdf_text_cache WHERE doc_hash = ?", (doc_hash,)
+        ).fetchone()
+        if row:
+            with conn:
+                conn.execute("UPDATE pdf_text_cache SET last_used = ? WHERE doc_hash = ?", (time.time(), doc_hash))
+        return row["text"] if row else None
+
+
+def _prune(conn, now):
+    """Drops texts unused for PDF_TEXT_CACHE_TTL, then least recently used ones until under the size limit."""
+    with conn:
+        stale = [
+            row["doc_hash"] for row in conn.execute(
+                "SELECT doc_hash FROM pdf_text_cache WHERE last_used <= ?", (now - PDF_TEXT_CACHE_TTL,)
+            )
+        ]
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pdf_text_cache WHERE last_used > ?", (now - PDF_TEXT_CACHE_TTL,)
+        ).fetchone()[0]
+        if total > PDF_TEXT_CACHE_MAX_BYTES:
+            for doc_hash, size in conn.execute(
+                "SELECT doc_hash, size FROM pdf_text_cache WHERE last_used > ? ORDER BY last_used",
+                (now - PDF_TEXT_CACHE_TTL,),
+            ).fetchall():
+                if total <= PDF_TEXT_CACHE_MAX_BYTES:
+                    break
+                stale.append(doc_hash)
+                total -= size
+        # section index bhi text ke saath jaata hai
+        conn.executemany("DELETE FROM pdf_text_cache WHERE doc_hash = ?", [(h,) for h in stale])
+        conn.executemany("DELETE FROM document_sections WHERE doc_hash = ?", [(h,) for h in stale])
+    if stale:
+        logging.info(f"Pruned {len(stale)} PDF texts from the cache")
+
+
+_pruner = PeriodicPrune(_prune, every=20)
+
+
+def _store_in_db(doc_hash, text):
+    now = time.time()
+    with db_connection() as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO pdf_text_cache (doc_hash, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (doc_hash, text, len(text.encode()), now),
+            )
+        _pruner.after_write(conn, now)
+
+
+def lookup_pdf_text(doc_hash):
+    """Returns cached text for the hash from memory or SQLite, or None."""
+    with _cache_lock:
+        text = _memory_cache.get(doc_hash)
+        if text is not None:
+            _memory_cache.move_to_end(doc_hash)
+            cache_stats["memory_hits"] += 1
+            return text
+
+    try:
+        text = _load_from_db(doc_hash)
+    except Exception as e:
+        logging.warning(f"PDF text cache lookup failed: {e}")
+        text = None
+    if text:
+        cache_stats["disk_hits"] += 1
+        _remember(doc_hash, text)
+    else:
+        cache_stats["misses"] += 1
+    return text
+
+
+def store_pdf_text(doc_hash, text):
+    """Saves freshly extracted text in both cache tiers."""
+    if not text:
+        return
+    _remember(doc_hash, text)
+    try:
+        _store_in_db(doc_hash, text)
+    except Exception as e:
+        logging.warning(f"PDF text cache write failed: {e}")
+
+
+async def _extract_and_store(doc_hash, source):
+    # text aur section index (outline/headings) ek hi pass mein
+    with stage_timer("pdf_extract"):
+        text, sections = await run_cpu_bound(extract_pdf_document, source)
+    await run_blocking(store_pdf_text, doc_hash, text)
+    await run_blocking(store_sections, doc_hash, sections)
+    return text
+
+
+async def pdf_text_for(doc_hash, source):
+    """Returns the text of a PDF given as bytes or a file path; parsing runs in the PDF process pool.
+
+    Concurrent calls for the same hash share one extraction. If that one was
+    reading another caller's temp file which is deleted before it's opened,
+    this call retries with its own `source`.
+    """
+    text = await run_blocking(lookup_pdf_text, doc_hash)
+    if text is not None:
+        return text
+    for attempt in range(_EXTRACT_ATTEMPTS):
+        # same PDF ek saath kai uploads mein aaye to parse ek hi baar
+        try:
+            return await _extractions.run(doc_hash, _extract_and_store, doc_hash, source)
+        except FileNotFoundError:
+            # flight kisi aur request ki spool file se chal raha tha aur woh request chali gayi
+            # (file delete); apni file abhi hai to naya flight apne source se
+            own_file_gone = not isinstance(source, (bytes, bytearray)) and not os.path.exists(source)
+            if own_file_gone or attempt + 1 == _EXTRACT_ATTEMPTS:
+                raise
+
+
+async def load_pdf_text(upload):
+    """Returns (doc_hash, text) for an UploadFile."""
+    with stage_timer("upload_read"):
+        pdf = await spool_upload(upload)
+    try:
+        return pdf.doc_hash, await pdf_text_for(pdf.doc_hash, pdf.source)
+    finally:
+        pdf.close()
@@ -0,0 +1,179 @@
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from io import BytesIO
+
+# Upload limits: isse bada PDF reject, aur isse bada disk pe spool hota hai
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+SPOOL_MAX_MEMORY = int(os.getenv("SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+# 0 = saare pages
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+)*\.?\s+\S|(?:chapter|section|unit|part|lesson|module)\b)", re.IGNORECASE)
+
+
+class UploadTooLarge(Exception):
+    """Raised when an uploaded PDF is bigger than MAX_UPLOAD_BYTES."""
+
+
+class SpooledPdf:
+    """An uploaded PDF held in memory, or in a private temp file once it gets large.
+
+    `source` is what the extractor takes: bytes for small uploads, a file
+    path for spooled ones (so the process pool doesn't get a huge pickle).
+    """
+
+    def __init__(self, doc_hash, size, data=None, path=None):
+        self.doc_hash = doc_hash
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self):
+        return self.data if self.data is not None else self.path
+
+    def close(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+async def spool_upload(upload):
+    """Reads an UploadFile in chunks, hashing as it goes, without one big read().
+
+    Small files stay in memory; larger ones go to a uniquely named temp file,
+    so two users uploading `notes.pdf` at the same time never collide.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill = None
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge(f"PDF is larger than {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB")
+            digest.update(chunk)
+            if spill is None and len(buffer) + len(chunk) > SPOOL_MAX_MEMORY:
+                spill = tempfile.NamedTemporaryFile(prefix="studify-", suffix=".pdf", delete=False)
+                spill.write(buffer)
+                buffer = None
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buffer.extend(chunk)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(spill.name)
+        raise
+
+    if spill is not None:
+        spill.close()
+        return SpooledPdf(digest.hexdigest(), size, path=spill.name)
+    return SpooledPdf(digest.hexdigest(), size, data=bytes(buffer))
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        return BytesIO(source)
+    with open(source, "rb") as f:
+        try:
+            # file map karke padho: pages OS page cache se aate hain, poori file heap mein copy nahi hoti
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # khaali file map nahi hoti
+            return BytesIO(b"")
+
+
+def is_heading(line):
+    """Guesses whether a raw text line is a heading: numbered, "Chapter ...", or ALL CAPS."""
+    words = line.split()
+    if not 1 <= len(words) <= 12 or len(line) > 100 or line.endswith((".", ",", ";")):
+        return False
+    return bool(_HEADING_RE.match(line)) or (line.isupper() and sum(c.isalpha() for c in line) >= 3)
+
+
+def _outline_titles(reader, max_pages):
+    """[(page_no, title)] from the PDF's bookmarks, flattened."""
+    titles = []
+
+    def walk(items):
+        for item in items:
+            if isinstance(item, list):
+                walk(item)
+                continue
+            try:
+                page_no = reader.get_destination_page_number(item)
+            except Exception:
+                continue
+            title = _WHITESPACE_RE.sub(" ", str(getattr(item, "title", "") or "")).strip()
+            if title and page_no is not None and (not max_pages or page_no < max_pages):
+                titles.append((page_no, title))
+
+    try:
+        walk(reader.outline)
+    except Exception:
+        pass  # toota hua outline: headings se kaam chalao
+    return titles
+
+
+def extract_pdf_document(source, max_pages=PDF_MAX_PAGES):
+    """Returns (text, sections) in one pass over the PDF.
+
+    `text` is the whitespace-normalized text of the pages, joined by single
+    spaces. `sections` is a list of {"title", "start", "end"} character spans
+    of `text`, taken from the PDF outline (bookmarks) and from heading-like
+    lines on each page.
+    """
+    from PyPDF2 import PdfReader  # lazy: startup pe PyPDF2 load nahi hota
+
+    stream = _open(source)
+    try:
+        reader = PdfReader(stream)
+        parts = []
+        page_starts = {}
+        starts = []  # (offset, title)
+        offset = 0
+        for page_no, page in enumerate(reader.pages):
+            if max_pages and page_no >= max_pages:
+                break
+            raw = page.extract_text() or ""
+            text = _WHITESPACE_RE.sub(" ", raw).strip()
+            page_starts[page_no] = offset
+            if not text:
+                continue
+            search_from = 0
+            for raw_line in raw.splitlines():
+                line = _WHITESPACE_RE.sub(" ", raw_line).strip()
+                if line and is_heading(line):
+                    position = text.find(line, search_from)
+                    if position != -1:
+                        starts.append((offset + position, line))
+                        search_from = position + len(line)
+            parts.append(text)
+            offset += len(text) + 1
+        for page_no, title in _outline_titles(reader, max_pages):
+            if page_no in page_starts:
+                starts.append((page_starts[page_no], title))
+    finally:
+        stream.close()
+
+    text = " ".join(parts)
+    sections = []
+    starts.sort()
+    for i, (start, title) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        if end > start:
+            sections.append({"title": title, "start": start, "end": end})
+    return text, sections
@@ -0,0 +1,351 @@
+import asyncio
+import json
+import logging
+import os
+import re
+
+from app.utils.executor import ServerBusy
+from app.utils.metrics import stage_timer
+
+# Ek Gemini call mein kitne MCQ maangne hain, aur kitne top-up rounds chalane hain
+MCQ_BATCH_SIZE = int(os.getenv("MCQ_BATCH_SIZE", "10"))
+MCQ_MAX_ROUNDS = int(os.getenv("MCQ_MAX_ROUNDS", "3"))
+
+# Gemini ko JSON schema ke saath call karo (response_mime_type=application/json)
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") == "1"
+
+MCQ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {
+                        "type": "object",
+                        "properties": {letter: {"type": "string"} for letter in "ABCD"},
+                        "required": list("ABCD"),
+                    },
+                    "correct_answer": {"type": "string"},
+                },
+                "required": ["question", "options", "correct_answer"],
+            },
+        },
+    },
+    "required": ["questions"],
+}
+THEORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "answer": {"type": "string"},
+    },
+    "required": ["question", "answer"],
+}
+MCQ_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": MCQ_SCHEMA} if STRUCTURED_OUTPUT else None
+THEORY_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": THEORY_SCHEMA} if STRUCTURED_OUTPUT else None
+
+_OPTION_RE = re.compile(r"^\(?([A-Da-d])[\)\.:]\s*(.+)$")
+_ANSWER_RE = re.compile(
+    r"^(?:correct\s+)?answer(?:\*\*)?\s*[:\-]\s*(?:\*\*)?\s*\(?([A-Da-d])\b", re.IGNORECASE
+)
+_QUESTION_RE = re.compile(r"^(?:\d+[\.\)]\s*)?(?:\*\*)?question(?:\s*\d+)?\s*[:\.]\s*(?:\*\*)?\s*", re.IGNORECASE)
+
+
+def build_mcq_batch_prompt(topic, difficulty, marks, topic_text, count, avoid=(), allow_general=False,
+                           batch_no=1, batches=1):
+    """Builds one prompt asking Gemini for `count` distinct MCQs."""
+    source = (
+        f"Base them on the following content, and use general knowledge of '{topic}' only if the content runs out:\n\n{topic_text}"
+        if allow_general
+        else f"Base them on the following content:\n\n{topic_text}"
+    )
+    avoid_block = ""
+    if batches > 1:
+        # parallel batches alag prompts hon, warna sab same questions laate hain
+        avoid_block = f"This is batch {batch_no} of {batches}; focus on a different part of the content than the other batches.\n"
+    if avoid:
+        avoid_block += "Do not repeat any of these existing questions:\n" + "\n".join(f"- {q}" for q in avoid) + "\n"
+
+    return f"""
+    Generate {count} different {marks}-mark multiple-choice questions on the topic '{topic}' at '{difficulty}' difficulty level.
+    Every question must have 4 answer options (A, B, C, D) with exactly one correct option, and no two questions may ask the same thing.
+    {avoid_block}{source}
+
+    Return JSON in this shape, with correct_answer being the letter of the correct option:
+    {{"questions": [{{"question": "What is AI?", "options": {{"A": "Artificial Intelligence", "B": "Automated Integration", "C": "Advanced Internet", "D": "Autonomous Input"}}, "correct_answer": "A"}}]}}
+    """
+
+
+def load_json(text):
+    """Parses JSON from a response, tolerating code fences and text around it; None if there is none."""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def _first(item, *keys):
+    for key in keys:
+        if item.get(key) not in (None, ""):
+            return item[key]
+    return None
+
+
+def _clean_option(text):
+    match = _OPTION_RE.match(str(text).strip())
+    return (match.group(2) if match else str(text)).strip()
+
+
+def validate_mcq(item, marks):
+    """Normalizes one JSON MCQ into {question, options A-D, correctAnswer, marks}, or returns None."""
+    if not isinstance(item, dict):
+        return None
+    question = _first(item, "question", "Question", "text")
+    options = _first(item, "options", "choices", "Options")
+    answer = _first(item, "correct_answer", "correctAnswer", "answer", "correct")
+    if not isinstance(question, str) or not question.strip() or options is None or answer is None:
+        return None
+    if isinstance(options, list):
+        options = dict(zip("ABCD", options)) if len(options) == 4 else {}
+    if not isinstance(options, dict):
+        return None
+    options = {str(k).strip().strip("()").upper()[:1]: _clean_option(v) for k, v in options.items()}
+    if set(options) != set("ABCD") or not all(options.values()):
+        return None
+
+    answer = str(answer).strip()
+    letter = _OPTION_RE.match(answer) or re.fullmatch(r"\(?([A-Da-d])\)?\.?", answer)
+    if letter:
+        answer = letter.group(1).upper()
+    else:
+        # kabhi kabhi model letter ki jagah option ka text de deta hai
+        matches = [k for k, v in options.items() if v.lower() == answer.lower()]
+        answer = matches[0] if matches else ""
+    if answer not in options:
+        return None
+    question = _QUESTION_RE.sub("", question.strip()).strip()
+    return {"question": question, "options": {k: options[k] for k in "ABCD"}, "correctAnswer": answer, "marks": marks}
+
+
+def parse_mcq_batch(text, marks):
+    """Parses every valid MCQ out of a batched response.
+
+    Reads the JSON shape of MCQ_SCHEMA (also a bare list, or JSON inside a
+    code fence); falls back to the plain "Question: / A) / Correct Answer:"
+    text format, so a response is only dropped if no question in it is usable.
+    """
+    data = load_json(text)
+    if isinstance(data, dict):
+        data = _first(data, "questions", "mcqs", "items") or [data]
+    if isinstance(data, list):
+        questions = [q for q in (validate_mcq(item, marks) for item in data) if q]
+        if questions:
+            return questions
+    return _parse_mcq_text(text, marks)
+
+
+def _parse_mcq_text(text, marks):
+    questions = []
+    current = None
+
+    def flush():
+        if current and current["question"] and len(current["options"]) == 4 and current["correctAnswer"] in current["options"]:
+            questions.append(current)
+
+    for raw_line in text.split("\n"):
+        line = raw_line.strip().strip("*").strip()
+        if not line:
+            continue
+        if _QUESTION_RE.match(line):
+            flush()
+            current = {"question": _QUESTION_RE.sub("", line).strip(), "options": {}, "correctAnswer": "", "marks": marks}
+            continue
+        if current is None:
+            continue
+        answer = _ANSWER_RE.match(line)
+        if answer:
+            current["correctAnswer"] = answer.group(1).upper()
+            continue
+        option = _OPTION_RE.match(line)
+        if option:
+            current["options"][option.group(1).upper()] = option.group(2).strip()
+        elif not current["options"]:
+            # question text ek se zyada line mein ho sakta hai
+            current["question"] = f"{current['question']} {line}".strip()
+    flush()
+    return questions
+
+
+def _question_key(question):
+    return re.sub(r"[^a-z0-9]+", " ", question.lower()).strip()
+
+
+async def generate_mcqs(call, topic, difficulty, marks, topic_text, num_questions, existing=()):
+    """Generates `num_questions` unique MCQs using batched, concurrent Gemini calls.
+
+    `call` is an async function that takes a prompt and returns a Gemini response.
+    `existing` holds question texts already in the paper, which are not repeated.
+    """
+    questions = []
+    seen = {_question_key(q) for q in existing}
+
+    for round_no in range(MCQ_MAX_ROUNDS):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+
+        # bade papers ke liye batches parallel mein bhejo
+        sizes = [min(MCQ_BATCH_SIZE, missing - start) for start in range(0, missing, MCQ_BATCH_SIZE)]
+        avoid = list(existing) + [q["question"] for q in questions]
+        with stage_timer("prompt_build"):
+            prompts = [
+                build_mcq_batch_prompt(
+                    topic, difficulty, marks, topic_text, size, avoid,
+                    allow_general=round_no == MCQ_MAX_ROUNDS - 1,
+                    batch_no=batch_no + 1, batches=len(sizes),
+                )
+                for batch_no, size in enumerate(sizes)
+            ]
+        responses = await asyncio.gather(*(call(prompt) for prompt in prompts), return_exceptions=True)
+
+        for response in responses:
+            if isinstance(response, ServerBusy):
+                raise response
+            if isinstance(response, Exception):
+                logging.error(f"Error generating MCQ batch: {response}")
+                continue
+            if not response:
+                continue
+            try:
+                # blocked/khaali response pe .text khud ValueError deta hai
+                text = response.text
+                if not text.strip():
+                    continue
+                with stage_timer("parse"):
+                    parsed = parse_mcq_batch(text, marks)
+            except Exception as e:
+                logging.error(f"Error parsing MCQ batch: {e}")
+                continue
+            for question in parsed:
+                key = _question_key(question["question"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                questions.append(question)
+
+    if len(questions) < num_questions:
+        logging.warning(f"Generated only {len(questions)} of {num_questions} MCQs for '{topic}'")
+    return questions[:num_questions]
+
+
+# Theory paper: (marks, word limit) buckets, bade se chhote tak bhare jaate hain
+THEORY_MARKS_DISTRIBUTION = [
+    (4, 150),  # 4-mark questions, 150 words
+    (8, 250),  # 8-mark questions, 250 words
+    (2, 60),   # 2-mark questions, 60 words
+    (1, 30),   # 1-mark questions, 30 words
+]
+
+
+def plan_theory_paper(total_marks):
+    """Returns [(marks, word_limit, count)] for a theory paper worth total_marks."""
+    plan = []
+    remaining_marks = total_marks
+    for marks, word_limit in THEORY_MARKS_DISTRIBUTION:
+        num_questions = remaining_marks // marks
+        remaining_marks -= num_questions * marks
+        plan.append((marks, word_limit, num_questions))
+    return plan
+
+
+_THEORY_LABEL_RE = re.compile(r"^(?:\*\*)?(question|answer)(?:\*\*)?\s*[:\-]\s*(?:\*\*)?\s*", re.IGNORECASE)
+
+
+def parse_theory_question(text, marks, word_limit):
+    """Parses a THEORY_SCHEMA JSON response (or 'Question: ... Answer: ...' text), or returns None."""
+    question = ""
+    answer = ""
+    data = load_json(text)
+    if isinstance(data, list) and data:
+        data = data[0]
+    if isinstance(data, dict):
+        question = str(_first(data, "question", "Question") or "").strip()
+        answer = str(_first(data, "answer", "Answer", "correctAnswer", "correct_answer") or "").strip()
+    else:
+        collecting = None
+        for raw_line in text.strip().split("\n"):
+            line = raw_line.strip()
+            label = _THEORY_LABEL_RE.match(line)
+            if label:
+                collecting = label.group(1).lower()
+                line = line[label.end():].strip()
+                if collecting == "question":
+                    question = line
+                else:
+                    answer = line
+            elif collecting == "question" and line:
+                question = f"{question} {line}".strip()
+            elif collecting == "answer":
+                answer = f"{answer} {line.strip()}".strip()
+
+    if question and answer:
+        return {
+            "question": question,
+            "marks": marks,
+            "word_limit": word_limit,
+            "correctAnswer": answer
+        }
+    return None
+
+
+async def generate_theory_questions(call, topic, difficulty, marks, word_limit, num_questions, on_question=None,
+                                    topic_text=""):
+    """Generates theory questions one Gemini call at a time.
+
+    `call` takes a prompt and returns a Gemini response; it should bypass the
+    response cache since the same prompt is sent repeatedly. `on_question`, if
+    given, is awaited with the questions so far after each new one.
+    `topic_text` is the document excerpt the questions should be based on.
+    """
+    source = f"Base the question on the following content:\n\n{topic_text}\n" if topic_text else ""
+    questions = []
+    for _ in range(num_questions):
+        try:
+            response = await call(f"""
+                Generate a concise theory question worth {marks} marks on the topic "{topic}" 
+                with difficulty level "{difficulty}". Avoid unnecessary details.
+                {source}
+                
+                Then, generate a well-structured answer within {word_limit} words. 
+                The answer should be clear, relevant, and informative but should not exceed the word limit.
+                
+                Return JSON: {{"question": "<concise question here>", "answer": "<answer within {word_limit} words>"}}
+            """)
+
+            if response and response.text.strip():
+                with stage_timer("parse"):
+                    question = parse_theory_question(response.text, marks, word_limit)
+                if question:
+                    questions.append(question)
+                    if on_question:
+                        await on_question(questions)
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logging.warning(f"Error generating theory question: {e}")
+    return questions
@@ -0,0 +1,356 @@
+import asyncio
+import importlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Gemini API ka rate limit (paid tier ya fake provider ke load tests ke liye env se badlo)
+MAX_RPM = int(os.getenv("GEMINI_MAX_RPM", "15"))  # Max requests per minute
+MAX_RPD = int(os.getenv("GEMINI_MAX_RPD", "1500"))  # Max requests per day
+MAX_TPM = int(os.getenv("GEMINI_MAX_TPM", "1000000"))  # Max tokens per minute
+
+# Priorities: chhota number pehle serve hota hai
+PRIORITY_INTERACTIVE = 0  # /askQuestion, /summarize-pdf
+PRIORITY_BULK = 1  # /analyze
+
+
+class DailyLimitReached(Exception):
+    """Raised when the daily request budget is used up."""
+
+
+class TokenBucket:
+    """Continuously refilling bucket: `capacity` units per `period` seconds."""
+
+    def __init__(self, capacity, period, now):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units can be taken (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount, now):
+        """Gives back `amount` units; a negative amount charges extra, down to one period of debt."""
+        self._refill(now)
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens + amount))
+
+
+class LocalQuotaBackend:
+    """In-process quota state; fine for a single worker."""
+
+    blocking = False
+
+    def __init__(self, max_rpm=MAX_RPM, max_tpm=MAX_TPM, max_rpd=MAX_RPD, clock=time.monotonic):
+        self.clock = clock
+        now = clock()
+        self.rpm = TokenBucket(max_rpm, 60, now)
+        self.tpm = TokenBucket(max_tpm, 60, now)
+        self.rpd = TokenBucket(max_rpd, 24 * 60 * 60, now)
+
+    def reserve(self, tokens):
+        """Atomically takes one request and `tokens` tokens; returns 0 or the seconds to wait."""
+        now = self.clock()
+        if self.rpd.available(now) < 1:
+            raise DailyLimitReached("Daily rate limit reached.")
+        wait = max(self.rpm.wait_time(1, now), self.tpm.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.rpm.consume(1, now)
+        self.tpm.consume(tokens, now)
+        self.rpd.consume(1, now)
+        return 0.0
+
+    def adjust_tokens(self, tokens):
+        """Returns over-reserved tokens to the TPM bucket (or takes more when negative)."""
+        self.tpm.refund(tokens, self.clock())
+
+    def snapshot(self):
+        now = self.clock()
+        return {
+            "requests_available_minute": self.rpm.available(now),
+            "tokens_available_minute": self.tpm.available(now),
+            "requests_available_day": self.rpd.available(now),
+        }
+
+
+class SqliteQuotaBackend:
+    """Quota state in a WAL-mode SQLite file shared by all workers on one host.
+
+    Each reservation runs in a BEGIN IMMEDIATE transaction, so refill, check
+    and consume happen atomically across processes.
+    """
+
+    blocking = True
+
+    def __init__(self, path, max_rpm=MAX_RPM, max_tpm=MAX_TPM, max_rpd=MAX_RPD, clock=time.time):
+        self.path = path
+        self.clock = clock  # wall clock, processes ke beech same hona chahiye
+        self.limits = {
+            "rpm": (max_rpm, 60),
+            "tpm": (max_tpm, 60),
+            "rpd": (max_rpd, 24 * 60 * 60),
+        }
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS gemini_quota (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn, now):
+        rows = {
+            name: (tokens, updated)
+            for name, tokens, updated in conn.execute("SELECT name, tokens, updated FROM gemini_quota")
+        }
+        buckets = {}
+        for name, (capacity, period) in self.limits.items():
+            bucket = TokenBucket(capacity, period, now)
+            if name in rows:
+                bucket.tokens, bucket.updated = min(rows[name][0], capacity), rows[name][1]
+            buckets[name] = bucket
+        return buckets
+
+    def _save(self, conn, buckets):
+        conn.executemany(
+            "INSERT OR REPLACE INTO gemini_quota (name, tokens, updated) VALUES (?, ?, ?)",
+            [(name, bucket.tokens, bucket.updated) for name, bucket in buckets.items()],
+        )
+
+    def reserve(self, tokens):
+        """Atomically takes one request and `tokens` tokens; returns 0 or the seconds to wait."""
+        conn = self._connect()
+        now = self.clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            buckets = self._load(conn, now)
+            if buckets["rpd"].available(now) < 1:
+                raise DailyLimitReached("Daily rate limit reached.")
+            wait = max(buckets["rpm"].wait_time(1, now), buckets["tpm"].wait_time(tokens, now))
+            if wait == 0:
+                buckets["rpm"].consume(1, now)
+                buckets["tpm"].consume(tokens, now)
+                buckets["rpd"].consume(1, now)
+                self._save(conn, buckets)
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def adjust_tokens(self, tokens):
+        """Returns over-reserved tokens to the TPM bucket (or takes more when negative)."""
+        conn = self._connect()
+        now = self.clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            buckets = self._load(conn, now)
+            buckets["tpm"].refund(tokens, now)
+            self._save(conn, buckets)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def snapshot(self):
+        now = self.clock()
+        buckets = self._load(self._connect(), now)
+        return {
+            "requests_available_minute": buckets["rpm"].available(now),
+            "tokens_available_minute": buckets["tpm"].available(now),
+            "requests_available_day": buckets["rpd"].available(now),
+        }
+
+
+def create_quota_backend():
+    """Builds the quota backend named by GEMINI_QUOTA_BACKEND.
+
+    "sqlite" (default) shares quota between workers on one host, "local" keeps
+    it per process, and "package.module:ClassName" loads a custom backend
+    (e.g. Redis-backed for several hosts) that takes the three limits as
+    keyword arguments. Custom backends may also implement `adjust_tokens`
+    to take part in usage reconciliation.
+    """
+    kind = os.getenv("GEMINI_QUOTA_BACKEND", "sqlite")
+    limits = {"max_rpm": MAX_RPM, "max_tpm": MAX_TPM, "max_rpd": MAX_RPD}
+    if kind == "local":
+        return LocalQuotaBackend(**limits)
+    if kind == "sqlite":
+        return SqliteQuotaBackend(os.getenv("GEMINI_QUOTA_DB", "gemini_quota.db"), **limits)
+    module_name, _, class_name = kind.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(**limits)
+
+
+class _Waiter:
+    __slots__ = ("tokens", "future", "enqueued_at")
+
+    def __init__(self, tokens, future, enqueued_at):
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class GeminiScheduler:
+    """Non-blocking RPM/TPM/RPD scheduler for Gemini calls.
+
+    Waiting callers sit in per-priority queues; within a priority the queue
+    rotates between users so one heavy user can't starve the rest. Quota
+    itself lives in `backend` (local or shared between workers). `clock`
+    and `sleep` can be swapped for fakes in tests.
+    """
+
+    def __init__(self, max_rpm=MAX_RPM, max_tpm=MAX_TPM, max_rpd=MAX_RPD,
+                 clock=time.monotonic, sleep=asyncio.sleep, backend=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.backend = backend or LocalQuotaBackend(max_rpm, max_tpm, max_rpd, clock)
+
+        self._queues = {}  # priority -> OrderedDict(user -> deque[_Waiter])
+        self._wakeup = None
+        self._dispatcher = None
+
+        self.granted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def queue_depth(self, priority=None):
+        queues = self._queues.values() if priority is None else [self._queues.get(priority, {})]
+        return sum(len(waiters) for users in queues for waiters in users.values())
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "queue_depth_by_priority": {p: self.queue_depth(p) for p in sorted(self._queues)},
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_avg": self.wait_seconds_total / self.granted if self.granted else 0.0,
+            **self.backend.snapshot(),
+        }
+
+    async def acquire(self, tokens, priority=PRIORITY_BULK, user=None):
+        """Waits (without blocking the loop) until one request and `tokens` tokens are free."""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(tokens, loop.create_future(), self.clock())
+        users = self._queues.setdefault(priority, OrderedDict())
+        users.setdefault(user, deque()).append(waiter)
+        self._ensure_dispatcher(loop)
+        self._wakeup.set()
+
+        wait = await waiter.future
+        self.granted += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        return wait
+
+    async def reconcile(self, tokens):
+        """Settles a call's reservation once its real usage is known: positive
+        `tokens` were over-reserved and go back to the budget, negative ones
+        are charged. Backends without `adjust_tokens` keep the estimate."""
+        adjust = getattr(self.backend, "adjust_tokens", None)
+        if adjust is None or not tokens:
+            return
+        if self.backend.blocking:
+            await asyncio.get_running_loop().run_in_executor(None, adjust, tokens)
+        else:
+            adjust(tokens)
+        if tokens > 0 and self._wakeup is not None:
+            self._wakeup.set()  # refund ke baad koi waiter fit ho sakta hai
+
+    def _ensure_dispatcher(self, loop):
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    def _head(self):
+        """Returns (priority, user, waiter) for the next waiter to serve."""
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            while users:
+                user, waiters = next(iter(users.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()  # cancelled (client chala gaya)
+                if waiters:
+                    return priority, user, waiters[0]
+                del users[user]
+        return None
+
+    def _pop(self, priority, user):
+        users = self._queues[priority]
+        waiters = users[user]
+        waiters.popleft()
+        if waiters:
+            users.move_to_end(user)  # round-robin between users
+        else:
+            del users[user]
+
+    async def _dispatch(self):
+        while True:
+            head = self._head()
+            if head is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, user, waiter = head
+            try:
+                if self.backend.blocking:
+                    loop = asyncio.get_running_loop()
+                    wait = await loop.run_in_executor(None, self.backend.reserve, waiter.tokens)
+                else:
+                    wait = self.backend.reserve(waiter.tokens)
+            except Exception as e:
+                # DailyLimitReached ya backend error: sirf isi waiter ko fail karo
+                self._pop(priority, user)
+                self.rejected += 1
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+                continue
+            if wait > 0:
+                # sirf dispatcher soyega, event loop free rahega
+                await self.sleep(wait)
+                continue
+
+            self._pop(priority, user)
+            now = self.clock()
+            if waiter.future.done():
+                # reserve ke dauraan cancel ho gaya; quota wapas nahi milega, bas aage badho
+                continue
+            waiter.future.set_result(now - waiter.enqueued_at)
+            if now - waiter.enqueued_at > 1:
+                logging.info(f"Gemini call waited {now - waiter.enqueued_at:.1f}s for rate limit")
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.database import PeriodicPrune, db_connection
+
+# Memory tier entries, disk tier size (bytes) aur TTL (seconds)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+_memory_cache = OrderedDict()  # key -> (text, expires_at)
+_cache_lock = threading.Lock()
+
+cache_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+class CachedResponse:
+    """Stand-in for a Gemini response served from the cache."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def response_key(prompt, model_name, generation_config=None):
+    """Cache key: normalized prompt + model name + generation parameters."""
+    payload = json.dumps(
+        [model_name, generation_config or {}, normalize_prompt(prompt)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _remember(key, text, expires_at):
+    with _cache_lock:
+        _memory_cache[key] = (text, expires_at)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > RESPONSE_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+            cache_stats["evictions"] += 1
+
+
+def _prune(conn, now):
+    """Drops expired rows, then least recently used rows until under the size limit."""
+    with conn:
+        conn.execute("DELETE FROM gemini_response_cache WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM gemini_response_cache").fetchone()[0]
+        if total <= RESPONSE_CACHE_MAX_BYTES:
+            return
+        removed = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM gemini_response_cache ORDER BY last_used"
+        ).fetchall():
+            if total <= RESPONSE_CACHE_MAX_BYTES:
+                break
+            conn.execute("DELETE FROM gemini_response_cache WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        cache_stats["evictions"] += removed
+
+
+_pruner = PeriodicPrune(_prune, every=100)
+
+
+def get_cached_response(key):
+    """Returns the cached response text for the key, or None on a miss."""
+    now = time.time()
+    with _cache_lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                _memory_cache.move_to_end(key)
+                cache_stats["memory_hits"] += 1
+                return entry[0]
+            del _memory_cache[key]
+
+    try:
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT response, expires_at FROM gemini_response_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row:
+                with conn:
+                    conn.execute("UPDATE gemini_response_cache SET last_used = ? WHERE key = ?", (now, key))
+    except Exception as e:
+        logging.warning(f"Response cache lookup failed: {e}")
+        row = None
+
+    if row is None:
+        cache_stats["misses"] += 1
+        return None
+    cache_stats["disk_hits"] += 1
+    _remember(key, row["response"], row["expires_at"])
+    return row["response"]
+
+
+def store_response(key, text, ttl=RESPONSE_CACHE_TTL):
+    """Saves a response text in both cache tiers."""
+    if not text:
+        return
+    now = time.time()
+    expires_at = now + ttl
+    _remember(key, text, expires_at)
+    cache_stats["stores"] += 1
+    try:
+        with db_connection() as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO gemini_response_cache (key, response, size, expires_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, text, len(text.encode()), expires_at, now),
+                )
+            _pruner.after_write(conn, now)
+    except Exception as e:
+        logging.warning(f"Response cache write failed: {e}")
@@ -0,0 +1,116 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+# Chunking aur retrieval settings (words mein)
+CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "200"))
+CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "40"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+# Isse chhote documents poore hi bhej do, index ka koi fayda nahi
+MIN_WORDS_FOR_RETRIEVAL = int(os.getenv("RETRIEVAL_MIN_WORDS", "1500"))
+INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "64"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when where which who why how with".split()
+)
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+index_stats = {"hits": 0, "misses": 0}
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_text(text, size=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits text into overlapping word windows."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(size - overlap, 1)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a document's chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(chunk_id, term frequency)]
+        self.lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((chunk_id, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query, k=TOP_K):
+        """Returns the ids of the top-k chunks for the query, best first."""
+        n = len(self.chunks)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / (self.avg_length or 1))
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def get_index(doc_hash, text):
+    """Returns the BM25 index for a document, building it once per document hash."""
+    with _index_lock:
+        index = _index_cache.get(doc_hash)
+        if index is not None:
+            _index_cache.move_to_end(doc_hash)
+            index_stats["hits"] += 1
+            return index
+        index_stats["misses"] += 1
+
+    index = BM25Index(chunk_text(text))
+    with _index_lock:
+        _index_cache[doc_hash] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def select_chunk_ids(doc_hash, text, query, k=TOP_K):
+    """Returns the sorted ids of the chunks relevant to `query`, or None when the whole text should be sent."""
+    if len(text.split()) < MIN_WORDS_FOR_RETRIEVAL:
+        return None
+    index = get_index(doc_hash, text)
+    chunk_ids = index.search(query, k)
+    if not chunk_ids:
+        # koi match nahi mila, shuru ke chunks bhej do
+        chunk_ids = range(min(k, len(index.chunks)))
+    return sorted(chunk_ids)
+
+
+def join_chunks(doc_hash, text, chunk_ids):
+    """Returns the given chunks of a document, in document order."""
+    index = get_index(doc_hash, text)
+    return "\n...\n".join(index.chunks[i] for i in sorted(chunk_ids))
+
+
+def select_context(doc_hash, text, query, k=TOP_K):
+    """Returns only the passages of `text` relevant to `query`, in document order."""
+    chunk_ids = select_chunk_ids(doc_hash, text, query, k)
+    if chunk_ids is None:
+        return text
+    return join_chunks(doc_hash, text, chunk_ids)
@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import aclosing
+
+from app.utils.metrics import COALESCED_CALLS
+
+
+class SingleFlight:
+    """Coalesces concurrent identical work within this process.
+
+    The first caller for a key starts `func()` as a task; callers arriving
+    while it runs await the same task and get the same result or exception.
+    The task is shielded, so one caller going away (client disconnect)
+    doesn't cancel the work for the others. Nothing is kept once it finishes;
+    results that should outlive the flight belong in a cache.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._flights = {}
+
+    def pending(self, key):
+        """The in-flight task for `key`, or None."""
+        return self._flights.get(key)
+
+    async def run(self, key, func, *args, **kwargs):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._land(key, done))
+        else:
+            COALESCED_CALLS.inc(operation=self.operation)
+        return await asyncio.shield(task)
+
+    def _land(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # sab callers chale gaye hon to bhi "never retrieved" warning na aaye
+
+
+class StreamFlight:
+    """Shares one upstream async stream among concurrent identical callers.
+
+    The first caller for a key starts `func()` (an async iterator) in a
+    task; every caller, including one arriving mid-stream, gets all items
+    from the start as they arrive. One caller going away doesn't stop the
+    stream for the others; the upstream is closed once all of them have.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._flights = {}
+
+    async def stream(self, key, func, *args, **kwargs):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Broadcast()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(flight.pump(func(*args, **kwargs)))
+            flight.task.add_done_callback(lambda done: self._land(key, flight))
+        else:
+            COALESCED_CALLS.inc(operation=self.operation)
+        flight.listeners += 1
+        try:
+            sent = 0
+            while True:
+                # pehle event pakdo, phir items: beech mein aaye item ka wakeup miss na ho
+                changed = flight.changed
+                while sent < len(flight.items):
+                    yield flight.items[sent]
+                    sent += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.listeners -= 1
+            if flight.listeners == 0 and not flight.done:
+                # sab chale gaye: upstream band karo (LLM slot aur quota chhodo)
+                flight.task.cancel()
+                self._land(key, flight)
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+class _Broadcast:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.listeners = 0
+        self.task = None
+        self.changed = asyncio.Event()
+
+    async def pump(self, source):
+        try:
+            async with aclosing(source) as items:
+                async for item in items:
+                    self.items.append(item)
+                    self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
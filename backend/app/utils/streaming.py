@@ -0,0 +1,73 @@
+import json
+import logging
+
+from fastapi.responses import StreamingResponse
+
+from app.utils.executor import ServerBusy
+
+# ?stream= ke allowed formats: Server-Sent Events ya newline-delimited JSON
+STREAM_FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def encode_event(fmt, payload, event="delta"):
+    """Encodes one stream event in the requested wire format."""
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, **payload}) + "\n"
+
+
+def event_stream_response(events, fmt):
+    """Wraps an async iterator of encoded events in a StreamingResponse."""
+    return StreamingResponse(
+        events,
+        media_type=STREAM_FORMATS[fmt],
+        # proxies buffering na karein, warna streaming ka fayda nahi
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def stream_text_response(pieces, result_key, fmt):
+    """Streams text pieces as `delta` events, then one `done` event with the full text.
+
+    `pieces` is an async iterator of strings; `result_key` is the field name the
+    non-streaming JSON response uses ("summary", "answer", ...).
+    """
+    async def events():
+        parts = []
+        try:
+            async for piece in pieces:
+                parts.append(piece)
+                yield encode_event(fmt, {"text": piece})
+            yield encode_event(fmt, {result_key: "".join(parts)}, event="done")
+        except ServerBusy:
+            yield encode_event(fmt, {"error": "Server is busy, please retry shortly."}, event="error")
+        except Exception as e:
+            logging.error(f"Error while streaming {result_key}: {e}")
+            yield encode_event(fmt, {"error": f"Failed to generate the {result_key}"}, event="error")
+
+    return event_stream_response(events(), fmt)
+
+
+def stream_items_response(items, result_key, fmt):
+    """Streams `(index, payload)` pairs as `item` events as soon as each is ready.
+
+    Ends with one `done` event holding every payload in index order under
+    `result_key`, the same shape as the non-streaming JSON response.
+    """
+    async def events():
+        results = {}
+        try:
+            async for index, payload in items:
+                results[index] = payload
+                yield encode_event(fmt, {"index": index, **payload}, event="item")
+            yield encode_event(fmt, {result_key: [results[i] for i in sorted(results)]}, event="done")
+        except ServerBusy:
+            yield encode_event(fmt, {"error": "Server is busy, please retry shortly."}, event="error")
+        except Exception as e:
+            logging.error(f"Error while streaming {result_key}: {e}")
+            yield encode_event(fmt, {"error": f"Failed to generate the {result_key}"}, event="error")
+
+    return event_stream_response(events(), fmt)
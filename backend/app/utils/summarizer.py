@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+
+from app.utils.executor import ServerBusy
+from app.utils.metrics import stage_timer
+
+# Isse chhota text ek hi prompt mein summarize ho jata hai (words)
+SUMMARY_DIRECT_WORDS = int(os.getenv("SUMMARY_DIRECT_WORDS", "4000"))
+# Map step ke section size (words)
+SUMMARY_MIN_SECTION_WORDS = int(os.getenv("SUMMARY_MIN_SECTION_WORDS", "1000"))
+SUMMARY_MAX_SECTION_WORDS = int(os.getenv("SUMMARY_MAX_SECTION_WORDS", "3000"))
+# Average sentences per content-defined boundary
+_BOUNDARY_EVERY = 40
+# Fail hue section summaries kitni baar dobara try karein
+SUMMARY_SECTION_RETRIES = int(os.getenv("SUMMARY_SECTION_RETRIES", "2"))
+_RETRY_DELAY = 1
+_MAX_LEVELS = 4
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+SUMMARY_PROMPT = "Summarize the following content in a concise and clear manner: "
+SECTION_PROMPT = (
+    "Summarize this section of a larger document in a concise and clear manner, "
+    "keeping key definitions, facts and figures: "
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive sections of one document. "
+    "Combine them into a single concise and clear summary of the whole document: "
+)
+
+
+def split_sections(text, min_words=SUMMARY_MIN_SECTION_WORDS, max_words=SUMMARY_MAX_SECTION_WORDS):
+    """Splits text into sections at content-defined sentence boundaries.
+
+    A section ends after a sentence whose hash hits the boundary condition
+    (once it has min_words), or when it reaches max_words. Boundaries depend
+    only on nearby sentences, so editing one part of a document leaves the
+    other sections - and their cached summaries - unchanged.
+    """
+    sections = []
+    current = []
+    words = 0
+    for sentence in _SENTENCE_RE.split(text):
+        current.append(sentence)
+        words += len(sentence.split())
+        digest = hashlib.md5(sentence.encode()).digest()
+        at_boundary = int.from_bytes(digest[:4], "big") % _BOUNDARY_EVERY == 0
+        if (words >= min_words and at_boundary) or words >= max_words:
+            sections.append(" ".join(current))
+            current, words = [], 0
+    if current:
+        sections.append(" ".join(current))
+    return sections
+
+
+async def _summarize_sections(call, sections, prompt):
+    """Summarizes every section concurrently, retrying failed ones.
+
+    Raises if any section still has no summary, so a reduce step never runs
+    on a document with silently missing parts.
+    """
+    summaries = [None] * len(sections)
+    pending = list(range(len(sections)))
+    for attempt in range(SUMMARY_SECTION_RETRIES + 1):
+        if attempt:
+            # thoda ruk ke sirf fail hue sections dobara
+            await asyncio.sleep(_RETRY_DELAY * attempt)
+        responses = await asyncio.gather(
+            *(call(prompt + sections[i]) for i in pending), return_exceptions=True
+        )
+        failed = []
+        for i, response in zip(pending, responses):
+            if isinstance(response, ServerBusy):
+                raise response
+            text = None
+            if response is not None and not isinstance(response, Exception):
+                try:
+                    # blocked response pe .text ValueError deta hai: baaki fail jaisa hi, retry karo
+                    text = (response.text or "").strip()
+                except Exception as e:
+                    response = e
+            if text:
+                summaries[i] = text
+            else:
+                logging.warning(f"Section {i} summary failed (attempt {attempt + 1}): {response}")
+                failed.append(i)
+        pending = failed
+        if not pending:
+            return summaries
+    raise Exception(f"Failed to summarize {len(pending)} of {len(sections)} sections of the document")
+
+
+async def build_summary_prompt(call, text):
+    """Returns the final summarization prompt for `text`.
+
+    Small documents are summarized directly. Large ones are split into
+    sections that are summarized concurrently (map); the section summaries
+    are reduced again level by level until they fit one prompt. `call` is an
+    async function taking a prompt and returning a Gemini response; per-section
+    results are reused through the Gemini response cache.
+    """
+    if len(text.split()) <= SUMMARY_DIRECT_WORDS:
+        return SUMMARY_PROMPT + text
+
+    with stage_timer("prompt_build"):
+        sections = split_sections(text)
+    prompt = SECTION_PROMPT
+    for _ in range(_MAX_LEVELS):
+        summaries = await _summarize_sections(call, sections, prompt)
+        combined = "\n\n".join(summaries)
+        if len(combined.split()) <= SUMMARY_DIRECT_WORDS or len(summaries) == 1:
+            break
+        # abhi bhi bada hai, ek level aur reduce karo
+        with stage_timer("prompt_build"):
+            sections = split_sections(combined)
+        prompt = REDUCE_PROMPT
+    return REDUCE_PROMPT + combined
@@ -0,0 +1,94 @@
+import math
+import os
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
+
+# Jab tak kisi endpoint ka asli output size pata na ho, itne output tokens reserve karo
+TOKEN_OUTPUT_DEFAULT = int(os.getenv("TOKEN_OUTPUT_DEFAULT", "512"))
+# Naye observations ka weight (exponential moving average)
+TOKEN_CALIBRATION_ALPHA = float(os.getenv("TOKEN_CALIBRATION_ALPHA", "0.1"))
+
+# Kaunsa endpoint Gemini call kar raha hai (ledger ke liye); middleware set karta hai
+current_endpoint = ContextVar("current_endpoint", default=None)
+# Logged-in user (token sub) jiske ledger mein call likhi jaye; anonymous calls "" ke naam
+current_account = ContextVar("current_account", default=None)
+
+# Gemini ke tokenizer jaisa andaaza: ~4 characters (kam se kam ek word) per token, punctuation alag
+_PUNCTUATION = ".,;:!?()[]{}\"'-/*=<>"
+_ESTIMATE_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=_ESTIMATE_CACHE_SIZE)
+def raw_token_count(text):
+    """Uncalibrated token count of `text`; only C-level string ops, so large prompts stay cheap."""
+    words = len(text.split())
+    punctuation = sum(map(text.count, _PUNCTUATION))
+    return max(words, math.ceil((len(text) - words - punctuation) / 4)) + punctuation
+
+
+class TokenEstimator:
+    """Token estimates calibrated against the usage Gemini reports.
+
+    `prompt_ratio` maps the local count to Gemini's prompt_token_count and
+    is learned from every response with usage_metadata. Expected output
+    tokens are tracked per endpoint, since a summary and an MCQ batch differ
+    by an order of magnitude.
+    """
+
+    def __init__(self, alpha=TOKEN_CALIBRATION_ALPHA, default_output=TOKEN_OUTPUT_DEFAULT):
+        self.alpha = alpha
+        self.default_output = default_output
+        self.prompt_ratio = 1.0
+        self.samples = 0
+        self._output = {}  # endpoint -> average output tokens
+        self._lock = threading.Lock()
+
+    def count(self, text):
+        """Calibrated token estimate for `text`."""
+        return math.ceil(raw_token_count(text) * self.prompt_ratio)
+
+    def expected_output(self, endpoint, generation_config=None):
+        expected = self._output.get(endpoint, self.default_output)
+        limit = (generation_config or {}).get("max_output_tokens")
+        return math.ceil(min(expected, limit) if limit else expected)
+
+    def observe(self, prompt, endpoint, prompt_tokens, output_tokens):
+        """Folds one response's reported usage into the calibration."""
+        raw = raw_token_count(prompt)
+        with self._lock:
+            if prompt_tokens and raw:
+                # pehle kuch samples pe seedha average, phir moving average
+                weight = max(self.alpha, 1 / (self.samples + 1))
+                self.prompt_ratio += weight * (prompt_tokens / raw - self.prompt_ratio)
+                self.samples += 1
+            if output_tokens is not None:
+                previous = self._output.get(endpoint)
+                self._output[endpoint] = (
+                    output_tokens if previous is None else previous + self.alpha * (output_tokens - previous)
+                )
+
+    def usage(self, prompt, endpoint, response=None, output_text=None):
+        """Returns (prompt_tokens, output_tokens) actually spent by a call.
+
+        Uses the response's usage_metadata when present (and learns from it),
+        otherwise falls back to calibrated estimates of the prompt and of
+        `output_text`.
+        """
+        metadata = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(metadata, "prompt_token_count", 0) or 0
+        output_tokens = getattr(metadata, "candidates_token_count", None)
+        if prompt_tokens:
+            self.observe(prompt, endpoint, prompt_tokens, output_tokens or 0)
+            return prompt_tokens, output_tokens or 0
+        prompt_tokens = self.count(prompt)
+        output_tokens = self.count(output_text) if output_text else 0
+        if output_text is not None:
+            self.observe(prompt, endpoint, None, output_tokens)
+        return prompt_tokens, output_tokens
+
+    def stats(self):
+        return {"prompt_ratio": self.prompt_ratio, "samples": self.samples, "expected_output": dict(self._output)}
+
+
+token_estimator = TokenEstimator()
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from app.utils.database import db_connection
+from app.utils.retrieval import get_index, tokenize
+
+# Question generator ko topic ka kitna text bhejna hai (words)
+TOPIC_EXCERPT_WORDS = int(os.getenv("TOPIC_EXCERPT_WORDS", "1500"))
+SECTION_CACHE_SIZE = int(os.getenv("SECTION_CACHE_SIZE", "256"))
+# Topic ke kitne words section title mein hon to section match maana jaaye
+_MIN_TITLE_MATCH = 0.5
+
+_sections_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _remember(doc_hash, sections):
+    with _cache_lock:
+        _sections_cache[doc_hash] = sections
+        _sections_cache.move_to_end(doc_hash)
+        while len(_sections_cache) > SECTION_CACHE_SIZE:
+            _sections_cache.popitem(last=False)
+
+
+def store_sections(doc_hash, sections):
+    """Saves a document's section spans (from extract_pdf_document) in both cache tiers."""
+    _remember(doc_hash, sections)
+    try:
+        with db_connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_sections (doc_hash, sections) VALUES (?, ?)",
+                (doc_hash, json.dumps(sections)),
+            )
+    except Exception as e:
+        logging.warning(f"Section index write failed: {e}")
+
+
+def get_sections(doc_hash):
+    """Returns the section spans for a document, or [] if none were recorded."""
+    with _cache_lock:
+        sections = _sections_cache.get(doc_hash)
+        if sections is not None:
+            _sections_cache.move_to_end(doc_hash)
+            return sections
+    try:
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT sections FROM document_sections WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+    except Exception as e:
+        logging.warning(f"Section index lookup failed: {e}")
+        return []
+    # purane cached documents ka section index nahi hai, BM25 se kaam chalega
+    sections = json.loads(row["sections"]) if row else []
+    _remember(doc_hash, sections)
+    return sections
+
+
+def _title_score(topic_terms, title):
+    title_terms = set(tokenize(title))
+    if not topic_terms or not title_terms:
+        return 0.0
+    return len(topic_terms & title_terms) / len(topic_terms)
+
+
+def _clip(text, max_words):
+    words = text.split()
+    return text if len(words) <= max_words else " ".join(words[:max_words])
+
+
+def topic_excerpt(doc_hash, text, topic, max_words=TOPIC_EXCERPT_WORDS):
+    """Returns the passages of `text` about `topic`, at most about `max_words` words.
+
+    Sections whose outline/heading title matches the topic come first; the
+    rest of the budget is filled with the best BM25 chunks for the topic.
+    Small documents are returned whole.
+    """
+    if len(text.split()) <= max_words:
+        return text
+
+    topic_terms = set(tokenize(topic))
+    passages = []
+    budget = max_words
+    matches = sorted(
+        (section for section in get_sections(doc_hash) if _title_score(topic_terms, section["title"]) >= _MIN_TITLE_MATCH),
+        key=lambda section: (-_title_score(topic_terms, section["title"]), section["start"]),
+    )
+    for section in matches:
+        if budget <= 0:
+            break
+        passage = _clip(text[section["start"]:section["end"]], budget)
+        passages.append(passage)
+        budget -= len(passage.split())
+
+    if budget > 0:
+        index = get_index(doc_hash, text)
+        chosen = "\n".join(passages)
+        chunk_ids = []
+        for chunk_id in index.search(topic, len(index.chunks)):
+            if budget <= 0:
+                break
+            if index.chunks[chunk_id][:200] in chosen:
+                continue  # section mein pehle se hai
+            chunk_ids.append(chunk_id)
+            budget -= len(index.chunks[chunk_id].split())
+        if not chunk_ids and not passages:
+            # topic ka koi word nahi mila: document ki shuruaat bhejo
+            return _clip(text, max_words)
+        passages.extend(index.chunks[i] for i in sorted(chunk_ids))
+    return "\n...\n".join(passages)
@@ -1,14 +1,11 @@
 import sqlite3
-from app.utils.database import get_db_connection
+from app.utils.database import db_connection
 
 def save_user_data(name, email):
-    conn = get_db_connection()
     try:
-        with conn:
+        with db_connection() as conn, conn:
             conn.execute(
                 "INSERT INTO users (name, email) VALUES (?, ?)", (name, email)
             )
     except sqlite3.IntegrityError as e:
         print(f"Error saving user data: {e}")
-    finally:
-        conn.close()
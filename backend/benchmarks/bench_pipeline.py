@@ -0,0 +1,274 @@
+"""End-to-end benchmark of the PDF -> summary / answer / question paper pipeline.
+
+Drives /summarize-pdf, /askQuestion and /analyze through the ASGI app (no
+network, no Gemini quota: LLM_PROVIDER=fake) and reports throughput,
+p50/p95/p99 latency, peak RSS and per-stage timings per scenario.
+
+Run from backend/ (needs httpx):
+
+    python -m benchmarks.bench_pipeline --pages 1 20 100 --requests 20 --concurrency 4
+    python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json
+
+With --baseline the exit code is 1 if any scenario's p95 or throughput
+regressed by more than --tolerance.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import math
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ENDPOINTS = ("summarize", "ask", "analyze")
+
+# wrapped app.app globals -> stage name (nested: llm_call andar bhi gina jata hai)
+_STAGES = {
+    "load_pdf_text": "pdf_load",
+    "select_context": "retrieval",
+    "build_summary_prompt": "summary_map_reduce",
+    "build_question_paper": "question_paper",
+    "call_gemini_api": "llm_call",
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # nearest-rank percentile
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _configure_env(args, workdir):
+    # app import hone se pehle: alag DB, fake LLM, local quota
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["GEMINI_QUOTA_DB"] = os.path.join(workdir, "quota.db")
+    os.environ.setdefault("GEMINI_QUOTA_BACKEND", "local")
+    os.environ.setdefault("GEMINI_MAX_RPM", "1000000")
+    os.environ.setdefault("GEMINI_MAX_RPD", "100000000")
+    os.environ.setdefault("GEMINI_MAX_TPM", "1000000000")
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_JITTER"] = str(args.llm_latency / 5)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.llm_error_rate)
+    os.environ.pop("FIREBASE_CONFIG_B64", None)
+
+
+def _instrument(main, timings):
+    """Wraps pipeline functions in app.app so each call's duration is recorded."""
+    def wrap(name, stage):
+        func = getattr(main, name)
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timings[stage].append(time.perf_counter() - start)
+        else:
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timings[stage].append(time.perf_counter() - start)
+        setattr(main, name, timed)
+
+    for name, stage in _STAGES.items():
+        wrap(name, stage)
+
+
+def _request(endpoint, pdf, args):
+    if endpoint == "summarize":
+        return "/summarize-pdf", {"pdfFile": ("bench.pdf", pdf, "application/pdf")}, {}
+    if endpoint == "ask":
+        return "/askQuestion", {"pdf_file": ("bench.pdf", pdf, "application/pdf")}, {
+            "question": "How does photosynthesis depend on the available energy?",
+            "word_limit": "80",
+        }
+    return "/analyze", {"pdf_file": ("bench.pdf", pdf, "application/pdf")}, {
+        "topic": "Photosynthesis",
+        "difficulty": "medium",
+        "question_type": args.question_type,
+        "total_marks": str(args.total_marks),
+        "marks_per_question": "1",
+        "fresh": "true",
+    }
+
+
+async def run_scenario(client, endpoint, pages, args, pdfs):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(n):
+        nonlocal errors
+        url, files, data = _request(endpoint, pdfs[n % len(pdfs)], args)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(url, files=files, data=data)
+            elapsed = time.perf_counter() - start
+        body = response.json()
+        if response.status_code != 200 or "error" in body:
+            errors += 1
+        else:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(args.requests)))
+    wall = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "pages": pages,
+        "requests": args.requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _pool_peak_rss_kb():
+    """Largest VmHWM among the live PDF pool workers (Linux only, else None)."""
+    from app.utils import executor
+    pool = executor._process_pool
+    peaks = []
+    for pid in (pool._processes if pool is not None else {}):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                peaks += [int(line.split()[1]) for line in f if line.startswith("VmHWM:")]
+        except OSError:
+            pass
+    return max(peaks) if peaks else None
+
+
+def _peak_rss_mb(pool_peak_kb):
+    # Linux pe ru_maxrss KB mein hai, macOS pe bytes
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return {"self": round(own, 1), "pdf_worker_max": round(pool_peak_kb / 1024, 1) if pool_peak_kb else None}
+
+
+def _stage_report(timings):
+    return {
+        stage: {
+            "calls": len(values),
+            "total_ms": _ms(sum(values)),
+            "p50_ms": _ms(statistics.median(values)),
+            "p95_ms": _ms(percentile(values, 95)),
+        }
+        for stage, values in sorted(timings.items())
+        if values
+    }
+
+
+async def run_benchmark(args):
+    import httpx
+    import app.app as main
+    from benchmarks.synthetic_pdf import synthetic_pdf
+
+    timings = defaultdict(list)
+    _instrument(main, timings)
+    scenarios = []
+    stages = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for pages in args.pages:
+                # har request alag PDF (cold path) ya --distinct-pdfs ka pool (cache hits)
+                count = args.distinct_pdfs or args.requests
+                for endpoint in args.endpoints:
+                    seed_base = (ENDPOINTS.index(endpoint) * 10_000 + pages) * 1000
+                    pdfs = [synthetic_pdf(pages, seed=seed_base + i) for i in range(count)]
+                    timings.clear()
+                    result = await run_scenario(client, endpoint, pages, args, pdfs)
+                    stages[f"{endpoint}/{pages}p"] = _stage_report(timings)
+                    scenarios.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+            pool_peak_kb = _pool_peak_rss_kb()
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "distinct_pdfs": args.distinct_pdfs,
+        },
+        "scenarios": scenarios,
+        "stages": stages,
+        "peak_rss_mb": _peak_rss_mb(pool_peak_kb),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Returns (lines, regressed) comparing p95 latency and throughput per scenario."""
+    previous = {(s["endpoint"], s["pages"]): s for s in baseline.get("scenarios", [])}
+    lines = []
+    regressed = False
+    for scenario in report["scenarios"]:
+        old = previous.get((scenario["endpoint"], scenario["pages"]))
+        if not old:
+            continue
+        for key, higher_is_worse in (("p95_ms", True), ("throughput_rps", False)):
+            new_value, old_value = scenario[key], old[key]
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            regressed = regressed or worse
+            lines.append(
+                f"{scenario['endpoint']}/{scenario['pages']}p {key}: {old_value} -> {new_value} "
+                f"({change:+.1%}){'  REGRESSION' if worse else ''}"
+            )
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 20, 100])
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--distinct-pdfs", type=int, default=0, help="reuse this many PDFs per scenario (0 = all distinct)")
+    parser.add_argument("--question-type", choices=("mcq", "theory"), default="mcq")
+    parser.add_argument("--total-marks", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", help="compare against this report")
+    parser.add_argument("--save-baseline", help="write the report here")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="studify-bench-") as workdir:
+        _configure_env(args, workdir)
+        report = asyncio.run(run_benchmark(args))
+
+    print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, regressed = compare(report, json.load(f), args.tolerance)
+        print("\n".join(lines) or "No matching scenarios in the baseline.")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
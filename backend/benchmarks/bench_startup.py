@@ -0,0 +1,67 @@
+"""Cold-start benchmark: `import app.app` and the first request, each in a fresh interpreter.
+
+Run from backend/:  python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Child process: import time, lifespan startup time aur pehle request ka time
+_CHILD = r"""
+import json, time
+start = time.perf_counter()
+import app.app as main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.get("/openapi.json")
+    first = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "first_request_ms": (first - started) * 1000,
+    "total_ms": (first - start) * 1000,
+}))
+"""
+
+
+def run_once(env):
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep-firebase", action="store_true", help="don't unset FIREBASE_CONFIG_B64")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_PATH", os.path.join(tmp, "bench.db"))
+        env.setdefault("GEMINI_QUOTA_DB", os.path.join(tmp, "quota.db"))
+        if not args.keep_firebase:
+            env.pop("FIREBASE_CONFIG_B64", None)
+        results = [run_once(env) for _ in range(args.runs)]
+
+    report = {}
+    for key in results[0]:
+        values = [r[key] for r in results]
+        report[key] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Synthetic text PDFs for the benchmarks (no PDF library needed to write them)."""
+import random
+
+_SUBJECTS = [
+    "Photosynthesis", "Cellular respiration", "The mitochondria", "Enzyme activity", "Osmosis",
+    "Newton's second law", "Kinetic energy", "An electric circuit", "Ohm's law", "Thermal conduction",
+    "The French Revolution", "The industrial economy", "Supply and demand", "Inflation", "A market equilibrium",
+    "A binary search tree", "Dynamic programming", "A hash table", "Recursion", "Graph traversal",
+]
+_VERBS = [
+    "depends on", "explains", "is measured by", "is limited by", "converts", "determines",
+    "is closely related to", "can be modelled with", "changes", "is an example of",
+]
+_OBJECTS = [
+    "the rate of the reaction", "the available energy", "the concentration gradient", "the total resistance",
+    "the net force on a body", "the structure of the data", "the price level", "long term growth",
+    "the amount of light absorbed", "the number of comparisons", "the temperature of the system",
+    "the distribution of resources", "the order of operations", "the surface area",
+]
+_WORDS_PER_PAGE = 350
+_CHARS_PER_LINE = 90
+
+
+def _sentence(rng):
+    return f"{rng.choice(_SUBJECTS)} {rng.choice(_VERBS)} {rng.choice(_OBJECTS)}."
+
+
+def synthetic_pages(num_pages, seed=0, words_per_page=_WORDS_PER_PAGE):
+    """Returns `num_pages` strings of study-notes-like text; same seed, same text."""
+    rng = random.Random(seed)
+    pages = []
+    for page_no in range(num_pages):
+        # heading alag line pe, jaise asli notes mein (topic index isse padhta hai)
+        heading = f"Chapter {page_no + 1}: {rng.choice(_SUBJECTS)}"
+        sentences = []
+        words = 0
+        while words < words_per_page:
+            sentence = _sentence(rng)
+            sentences.append(sentence)
+            words += len(sentence.split())
+        pages.append(heading + "\n" + " ".join(sentences))
+    return pages
+
+
+def _wrap(text, width=_CHARS_PER_LINE):
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + len(word) + 1 > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Writes a minimal PDF (one Helvetica text page per string) and returns its bytes."""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = [line for paragraph in text.split("\n") for line in _wrap(paragraph)]
+        content = "BT /F1 10 Tf 40 760 Td 12 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def synthetic_pdf(num_pages, seed=0):
+    return make_pdf(synthetic_pages(num_pages, seed))